@@ -0,0 +1,185 @@
+"""
+Benchmark: legacy price/text/stock helpers vs the precompiled price parsing and
+the zoned stock phrase matching in sitemap_catalog_exporter.py, on a corpus of
+saved product pages.
+
+Usage:
+    python benchmarks/price_parsing.py [CORPUS] [--repeat N]
+
+A fixed set of tricky snippets (EDGE_CASES, also run by the test suite) is checked
+against known prices first. CORPUS is a directory of saved product pages (*.html,
+*.htm) or a text file with one snippet of page text per line. Pages are parsed once
+up front, so only the text/price/stock helpers are timed. Prices on which both paths
+disagree are listed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Callable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from sitemap_catalog_exporter import (  # noqa: E402
+    IN_STOCK_PHRASES,
+    OUT_OF_STOCK_PHRASES,
+    PageContext,
+    clean_text,
+    extract_price,
+    extract_stock_status,
+    find_price,
+)
+
+LEGACY_TEXT_PRICE = r"(€|\$|£)\s*([0-9]+(?:[.,][0-9]{2})?)"
+
+# Snippets that once parsed wrong, with the price they should give. Numbers in
+# neighbouring elements end up space-separated in the page text and must not merge.
+EDGE_CASES = [
+    ("<p>€ 9</p><p>100 in stock</p>", 9.0),
+    ("<span>€ 12</span><span>250 reviews</span>", 12.0),
+    ("<p>€ 5 100% cotton</p>", 5.0),
+    ("<p>€ 1 234,56</p>", 1234.56),
+    ("<p>€ 1\u00a0234,56</p>", 1234.56),
+    ("<p>CHF 1'234.50</p>", 1234.5),
+    ("<p>$1,299.99</p>", 1299.99),
+    ("<p>1.234,56 €</p>", 1234.56),
+]
+
+
+def legacy_clean_text(s: str) -> str:
+    return re.sub(r"\s+", " ", (s or "").strip())
+
+
+def legacy_extract_price(soup: BeautifulSoup, text: str) -> Optional[float]:
+    # The price extraction as it was before the precompiled parser
+    meta_price = soup.select_one('[itemprop="price"]')
+    if meta_price:
+        content = meta_price.get("content") or meta_price.get_text()
+        if content:
+            m = re.search(r"([0-9]+(?:[.,][0-9]{2})?)", content)
+            if m:
+                try:
+                    return float(m.group(1).replace(",", "."))
+                except:  # noqa: E722
+                    pass
+    ogp = soup.select_one('meta[property="product:price:amount"]')
+    if ogp and ogp.get("content"):
+        try:
+            return float(ogp["content"].replace(",", "."))
+        except:  # noqa: E722
+            pass
+    m = re.search(LEGACY_TEXT_PRICE, text)
+    if m:
+        try:
+            return float(m.group(2).replace(",", "."))
+        except:  # noqa: E722
+            pass
+    return None
+
+
+def legacy_extract_stock_status(text: str) -> str:
+    # Substring checks on the whole page text, as before the phrase matcher
+    t = text.lower()
+    if any(p in t for p in OUT_OF_STOCK_PHRASES):
+        return "out_of_stock"
+    if any(p in t for p in IN_STOCK_PHRASES):
+        return "in_stock"
+    return ""
+
+
+def load_corpus(path: str) -> List[str]:
+    if os.path.isdir(path):
+        docs = []
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith((".html", ".htm")):
+                with open(os.path.join(path, name), encoding="utf-8", errors="replace") as fh:
+                    docs.append(fh.read())
+        return docs
+    with open(path, encoding="utf-8", errors="replace") as fh:
+        return [f"<html><body><p>{line.strip()}</p></body></html>" for line in fh if line.strip()]
+
+
+def timed(label: str, fn: Callable[[], object], repeat: int, items: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<28} {best * 1000:9.2f} ms  ({best / max(1, items) * 1e6:7.1f} us/page)")
+    return best
+
+
+def check_edge_cases() -> int:
+    wrong = 0
+    for html, expected in EDGE_CASES:
+        got = extract_price(PageContext.from_html(f"<html><body>{html}</body></html>"))
+        if got != expected:
+            wrong += 1
+            print(f"  {html!r}: expected={expected!r} got={got!r}")
+    print(f"Edge cases wrong: {wrong}/{len(EDGE_CASES)}\n")
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark legacy vs precompiled price parsing.")
+    parser.add_argument("corpus", nargs="?",
+                        help="Directory of product pages (*.html) or a text file, one snippet per line.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per variant; the best is reported.")
+    args = parser.parse_args()
+
+    wrong = check_edge_cases()
+    if not args.corpus:
+        raise SystemExit(1 if wrong else 0)
+    docs = load_corpus(args.corpus)
+    if not docs:
+        raise SystemExit(f"No pages found in {args.corpus}")
+    pages = [PageContext.from_html(html) for html in docs]
+    texts = [page.text for page in pages]
+    print(f"{len(pages)} pages, {sum(map(len, texts)) / len(texts):.0f} chars of text on average\n")
+
+    def run_new_price():
+        for page in pages:
+            page.__dict__.pop("price_match", None)  # cached per page; time the parse itself
+            extract_price(page)
+
+    def run_new_stock():
+        for page in pages:
+            for cached in ("lower_text", "_zones", "_controls"):  # time the matching and zoning, not earlier pages' caches
+                page.__dict__.pop(cached, None)
+            extract_stock_status(page)
+
+    old = timed("clean_text (legacy)", lambda: [legacy_clean_text(t) for t in texts], args.repeat, len(texts))
+    new = timed("clean_text (compiled)", lambda: [clean_text(t) for t in texts], args.repeat, len(texts))
+    print(f"{'':<28} {old / new:9.2f}x\n")
+    old = timed("price in text (legacy)", lambda: [re.search(LEGACY_TEXT_PRICE, t) for t in texts],
+                args.repeat, len(texts))
+    new = timed("price in text (find_price)", lambda: [find_price(t) for t in texts], args.repeat, len(texts))
+    print(f"{'':<28} {old / new:9.2f}x\n")
+    old = timed("extract_price (legacy)", lambda: [legacy_extract_price(p.soup, t) for p, t in zip(pages, texts)],
+                args.repeat, len(pages))
+    new = timed("extract_price (compiled)", run_new_price, args.repeat, len(pages))
+    print(f"{'':<28} {old / new:9.2f}x\n")
+    old = timed("stock status (legacy)", lambda: [legacy_extract_stock_status(t) for t in texts], args.repeat, len(texts))
+    new = timed("stock status (zoned)", run_new_stock, args.repeat, len(pages))
+    print(f"{'':<28} {old / new:9.2f}x\n")
+
+    differ = 0
+    for i, (page, text) in enumerate(zip(pages, texts)):
+        before, after = legacy_extract_price(page.soup, text), extract_price(page)
+        if before != after:
+            differ += 1
+            if differ <= 20:
+                print(f"  page {i}: legacy={before!r} new={after!r}")
+    print(f"Prices that differ: {differ}/{len(pages)}")
+    stock_differ = sum(legacy_extract_stock_status(t) != extract_stock_status(p) for p, t in zip(pages, texts))
+    print(f"Stock statuses that differ: {stock_differ}/{len(pages)} (footer and button text no longer count)")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,43 +8,102 @@ Universal Sitemap Catalog Exporter
 
 from __future__ import annotations
 
+import os
 import re
 import sys
+import csv
+import sqlite3
 import time
 import json
+import fnmatch
+import gzip
+import hashlib
+import zlib
 import argparse
+import asyncio
+import math
+import random
+import signal
+import socket
+import tempfile
+import threading
+import queue
+from array import array
+from bisect import bisect_right
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import Iterable, List, Optional, Tuple, Dict, Set
+from functools import cached_property
+from typing import Awaitable, BinaryIO, Iterable, Iterator, List, Optional, Tuple, Dict, Set, Union
+from email.utils import parsedate_to_datetime
+from html import unescape
 from urllib.parse import urlparse
 
 import requests
-from bs4 import BeautifulSoup
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, NavigableString, Tag
+from lxml import etree
+from openpyxl import Workbook
 from tqdm import tqdm
 
+try:
+    import httpx  # optional: only needed for --http2 and --async
+except ImportError:
+    httpx = None
+
+try:
+    import ahocorasick  # optional: single-pass stock phrase matching (pip install pyahocorasick)
+except ImportError:
+    ahocorasick = None
+
+try:
+    import pyarrow as pa  # optional: only needed for --format parquet
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (CatalogExporter/1.0; +https://github.com/)"
 }
 
-# Common stock phrases (best-effort; extend for your language/shops)
-OUT_OF_STOCK_PHRASES = [
-    "out of stock",
-    "sold out",
-    "not in stock",
-    "currently unavailable",
-    "niet op voorraad",
-    "niet meer op voorraad",
-    "uitverkocht",
-    "niet leverbaar",
-    "temporarily unavailable",
-]
-IN_STOCK_PHRASES = [
-    "in stock",
-    "op voorraad",
-    "available",
-    "add to cart",
-    "add to basket",
-]
+CATALOG_COLUMNS = ["category", "subcategory", "title", "price", "currency", "stock", "stock_match", "url", "error"]
+
+DEFAULT_WORKERS = 8
+STREAM_CHUNK_SIZE = 64 * 1024
+CACHE_TOUCH_FLUSH_EVERY = 1000  # cache hits whose recency is kept in memory before writing it
+
+# Common stock phrases per locale (best-effort; add your own with --stock-phrases)
+STOCK_PHRASE_PACKS: Dict[str, Dict[str, List[str]]] = {
+    "en": {
+        "out_of_stock": [
+            "out of stock",
+            "sold out",
+            "not in stock",
+            "currently unavailable",
+            "temporarily unavailable",
+        ],
+        "in_stock": [
+            "in stock",
+            "available",
+            "add to cart",
+            "add to basket",
+        ],
+    },
+    "nl": {
+        "out_of_stock": [
+            "niet op voorraad",
+            "niet meer op voorraad",
+            "uitverkocht",
+            "niet leverbaar",
+        ],
+        "in_stock": [
+            "op voorraad",
+        ],
+    },
+}
+OUT_OF_STOCK_PHRASES = [p for pack in STOCK_PHRASE_PACKS.values() for p in pack["out_of_stock"]]
+IN_STOCK_PHRASES = [p for pack in STOCK_PHRASE_PACKS.values() for p in pack["in_stock"]]
 
 
 @dataclass
@@ -55,15 +114,831 @@ class FilterConfig:
     must_contain_any: List[str] = None  # if set, URL must contain at least one of these
 
 
-def fetch_text(url: str, headers: dict, timeout: int = 30) -> str:
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header as seconds from now (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostRateLimiter:
+    """
+    Token-bucket rate limiter keyed by host, shared by all fetch workers.
+
+    rate is requests/second per host (0 = unlimited), burst is the bucket size.
+    With adaptive=True a 429/503 halves the host's rate and successful responses
+    slowly restore it (AIMD); Retry-After always pauses the host.
+    """
+
+    THROTTLE_STATUSES = (429, 503)
+    DEFAULT_PAUSE_S = 1.0
+    MAX_PAUSE_S = 300.0
+
+    def __init__(self, rate: float = 0.0, burst: int = 1, adaptive: bool = True):
+        self.rate = max(0.0, rate)
+        self.burst = max(1, burst)
+        self.adaptive = adaptive
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def _state(self, host: str, now: float) -> Dict[str, float]:
+        st = self._hosts.get(host)
+        if st is None:
+            st = {
+                "rate": self.rate,
+                "base": self.rate,
+                "tokens": float(self.burst),
+                "updated": now,
+                "paused_until": 0.0,
+                "pause": self.DEFAULT_PAUSE_S,
+            }
+            self._hosts[host] = st
+        return st
+
+    def reserve(self, url: str) -> float:
+        """Claims one request slot for url's host; returns seconds to wait before sending."""
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            st = self._state(host, now)
+            wait = max(0.0, st["paused_until"] - now)
+            rate = st["rate"]
+            if rate > 0:
+                st["tokens"] = min(float(self.burst), st["tokens"] + (now - st["updated"]) * rate)
+                st["updated"] = now
+                # Tokens may go negative: later callers queue up behind earlier ones.
+                st["tokens"] -= 1.0
+                if st["tokens"] < 0:
+                    wait = max(wait, -st["tokens"] / rate)
+            return wait
+
+    def acquire(self, url: str) -> None:
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    def set_rate(self, url: str, rate: float) -> None:
+        """Overrides the rate for one host (e.g. from robots.txt Crawl-delay)."""
+        host = urlparse(url).netloc
+        with self._lock:
+            st = self._state(host, time.monotonic())
+            st["rate"] = st["base"] = max(0.0, rate)
+
+    def feedback(self, url: str, status_code: int, retry_after: Optional[str] = None) -> None:
+        """Reports a response so throttling statuses slow the host down."""
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            st = self._state(host, now)
+            if status_code in self.THROTTLE_STATUSES:
+                pause = parse_retry_after(retry_after)
+                if pause is None:
+                    pause = st["pause"]
+                    st["pause"] = min(self.MAX_PAUSE_S, st["pause"] * 2)
+                st["paused_until"] = max(st["paused_until"], now + min(pause, self.MAX_PAUSE_S))
+                if self.adaptive and st["rate"] > 0:
+                    st["rate"] = max(st["base"] / 16, st["rate"] / 2)
+            else:
+                st["pause"] = self.DEFAULT_PAUSE_S
+                if self.adaptive and 0 < st["rate"] < st["base"]:
+                    st["rate"] = min(st["base"], st["rate"] + st["base"] / 20)
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+TRANSIENT_ERRORS: Tuple[type, ...] = (requests.ConnectionError, requests.Timeout)
+if httpx is not None:
+    TRANSIENT_ERRORS += (httpx.TransportError,)
+
+
+class RetryPolicy:
+    """
+    Retries with full-jitter exponential backoff, shared by all workers.
+
+    Transient failures (connection errors, timeouts, 429/5xx) are retried up to
+    `retries` times. The retry budget caps retries at min_budget + budget_ratio
+    of all requests sent, so a broken shop cannot multiply our traffic.
+    """
+
+    def __init__(
+        self,
+        retries: int = 2,
+        base_delay_s: float = 0.5,
+        max_delay_s: float = 30.0,
+        budget_ratio: float = 0.2,
+        min_budget: int = 20,
+    ):
+        self.retries = max(0, retries)
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.budget_ratio = budget_ratio
+        self.min_budget = min_budget
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._retries_used = 0
+
+    def on_request(self) -> None:
+        with self._lock:
+            self._requests += 1
+
+    def next_delay(self, attempt: int) -> Optional[float]:
+        """Seconds to wait before retry number attempt+1, or None if we should give up."""
+        if attempt >= self.retries:
+            return None
+        with self._lock:
+            if self._retries_used >= self.min_budget + self.budget_ratio * self._requests:
+                return None
+            self._retries_used += 1
+        return random.uniform(0, min(self.max_delay_s, self.base_delay_s * (2 ** attempt)))
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. After `threshold` consecutive failures (connection
+    errors, timeouts, 5xx) the host is paused for cooldown_s; requests to it wait
+    (wait() blocks) instead of being sent. After the cooldown a single probe request
+    goes out: a success closes the circuit and releases everyone, a failure pauses
+    the host again. Only after max_pauses pauses in a row is the host given up on,
+    and requests to it fail fast with CircuitOpenError.
+    """
+
+    POLL_S = 0.5
+
+    def __init__(self, threshold: int = 10, cooldown_s: float = 60.0, max_pauses: int = 3):
+        self.threshold = max(1, threshold)
+        self.cooldown_s = cooldown_s
+        self.max_pauses = max(1, max_pauses)
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def _state(self, host: str) -> Dict[str, float]:
+        st = self._hosts.get(host)
+        if st is None:
+            st = self._hosts[host] = {"failures": 0, "open_until": 0.0, "pauses": 0, "probe_until": 0.0}
+        return st
+
+    def delay(self, url: str) -> float:
+        """Seconds to wait before sending to url's host (0 = send now); raises once the host is given up."""
+        host = urlparse(url).netloc
+        with self._lock:
+            st = self._hosts.get(host)
+            if st is None or not st["pauses"]:
+                return 0.0
+            if st["pauses"] > self.max_pauses:
+                raise CircuitOpenError(f"Circuit open for {host}: still failing after {self.max_pauses} pauses")
+            now = time.monotonic()
+            if st["open_until"] > now:
+                return st["open_until"] - now
+            if st["probe_until"] > now:
+                return min(self.POLL_S, st["probe_until"] - now)  # another request is probing the host
+            st["probe_until"] = now + self.cooldown_s
+            return 0.0
+
+    def wait(self, url: str) -> None:
+        """Blocks while url's host is paused."""
+        while True:
+            wait = self.delay(url)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def record(self, url: str, ok: bool) -> None:
+        host = urlparse(url).netloc
+        with self._lock:
+            if ok:
+                self._hosts.pop(host, None)
+                return
+            st = self._state(host)
+            st["failures"] += 1
+            now = time.monotonic()
+            probing = st["probe_until"] > now
+            if st["open_until"] > now or (st["failures"] < self.threshold and not probing):
+                return
+            st["pauses"] += 1
+            st["probe_until"] = 0.0
+            st["open_until"] = now + self.cooldown_s
+            if st["pauses"] > self.max_pauses:
+                print(f"[WARN] Giving up on {host}: still failing after {self.max_pauses} pauses.", file=sys.stderr)
+            else:
+                print(f"[WARN] Pausing {host} for {self.cooldown_s:g}s after {st['failures']} consecutive failures.",
+                      file=sys.stderr)
+
+
+class HttpCache:
+    """
+    On-disk HTTP cache for conditional requests.
+
+    Bodies are stored gzip-compressed, one file per URL; ETag/Last-Modified
+    validators live in a SQLite index. Only responses carrying a validator are
+    cached. Least recently used bodies are evicted once the total exceeds max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " etag TEXT NOT NULL DEFAULT '',"
+            " last_modified TEXT NOT NULL DEFAULT '',"
+            " encoding TEXT NOT NULL DEFAULT '',"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        # key -> last_used for cache hits, written in one short transaction so that a read never
+        # leaves a write transaction open for other processes sharing the directory
+        self._touched: Dict[str, float] = {}
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".gz")
+
+    def _entry(self, url: str) -> Optional[Tuple[str, str, str, str]]:
+        key = self._key(url)
+        with self._lock:
+            hit = self._db.execute(
+                "SELECT key, etag, last_modified, encoding FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if hit is not None:
+                self._touched[key] = time.time()
+                if len(self._touched) >= CACHE_TOUCH_FLUSH_EVERY:
+                    self._flush_touched()
+                    self._db.commit()
+        if hit is None or not os.path.exists(self._path(key)):
+            return None
+        return hit
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """Conditional request headers for url (empty when nothing usable is cached)."""
+        hit = self._entry(url)
+        if hit is None:
+            return {}
+        _, etag, last_modified, _ = hit
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def get(self, url: str) -> Optional[Tuple[bytes, str]]:
+        """Cached (body, encoding) for url, or None."""
+        hit = self._entry(url)
+        if hit is None:
+            return None
+        try:
+            with gzip.open(self._path(hit[0]), "rb") as fh:
+                return fh.read(), hit[3]
+        except OSError:
+            return None
+
+    def iter_body(self, url: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        hit = self._entry(url)
+        if hit is None:
+            return
+        with gzip.open(self._path(hit[0]), "rb") as fh:
+            while True:
+                chunk = fh.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def writer(self, url: str, etag: str = "", last_modified: str = "", encoding: str = "") -> "_CacheWriter":
+        return _CacheWriter(self, url, etag or "", last_modified or "", encoding or "")
+
+    def put(self, url: str, body: bytes, etag: str = "", last_modified: str = "", encoding: str = "") -> None:
+        w = self.writer(url, etag, last_modified, encoding)
+        w.write(body)
+        w.commit()
+
+    def _commit(self, url: str, tmp_path: str, etag: str, last_modified: str, encoding: str) -> None:
+        key = self._key(url)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._flush_touched()
+            old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, url, etag, last_modified, encoding, size, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, etag, last_modified, encoding, size, time.time()),
+            )
+            self._total += size - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _flush_touched(self) -> None:
+        # Caller holds the lock and commits.
+        if self._touched:
+            self._db.executemany(
+                "UPDATE entries SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self) -> None:
+        # Caller holds the lock. Evict down to 90% so we don't evict on every put.
+        target = int(self.max_bytes * 0.9)
+        cur = self._db.execute("SELECT key, size FROM entries ORDER BY last_used")
+        victims = []
+        for key, size in cur:
+            if self._total <= target:
+                break
+            victims.append(key)
+            self._total -= size
+        for key in victims:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._flush_touched()
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+
+class _CacheWriter:
+    """Streams one body into the cache; nothing is visible until commit()."""
+
+    def __init__(self, cache: HttpCache, url: str, etag: str, last_modified: str, encoding: str):
+        self._cache = cache
+        self._url = url
+        self._meta = (etag, last_modified, encoding)
+        path = cache._path(cache._key(url))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._tmp = f"{path}.{threading.get_ident()}.tmp"
+        self._fh = gzip.open(self._tmp, "wb", compresslevel=5)
+
+    def write(self, data: bytes) -> None:
+        self._fh.write(data)
+
+    def commit(self) -> None:
+        self._fh.close()
+        self._cache._commit(self._url, self._tmp, *self._meta)
+
+    def abort(self) -> None:
+        self._fh.close()
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+
+@dataclass
+class FetchResult:
+    text: str
+    not_modified: bool = False  # served from HttpCache after a 304
+
+
+class HttpClient:
+    """
+    Pooled keep-alive HTTP client shared by the sitemap crawl and product workers.
+
+    Keeps up to pool_size open connections per host so repeated requests skip the
+    TCP/TLS handshake. http2=True uses httpx instead of requests
+    (pip install "httpx[http2]"). The optional limiter is applied to every request;
+    with a cache, requests are conditional and 304s are served from disk. Transient
+    failures are retried per `retry`, and `breaker` pauses hosts that keep failing.
+    """
+
+    def __init__(
+        self,
+        headers: dict,
+        timeout: int = 30,
+        pool_size: int = DEFAULT_WORKERS,
+        limiter: Optional[HostRateLimiter] = None,
+        http2: bool = False,
+        cache: Optional[HttpCache] = None,
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.timeout = timeout
+        self.limiter = limiter
+        self.http2 = http2
+        self.cache = cache
+        self.retry = retry
+        self.breaker = breaker
+        pool_size = max(1, pool_size)
+        if http2:
+            if httpx is None:
+                raise RuntimeError('HTTP/2 requires httpx: pip install "httpx[http2]"')
+            self._session = httpx.Client(
+                http2=True,
+                headers=headers,
+                timeout=timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size),
+            )
+        else:
+            self._session = requests.Session()
+            self._session.headers.update(headers)
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+
+    def _send(self, url: str, headers: Optional[dict], stream: bool):
+        if self.http2:
+            request = self._session.build_request("GET", url, headers=headers)
+            return self._session.send(request, stream=stream)
+        return self._session.get(url, timeout=self.timeout, headers=headers, stream=stream)
+
+    def _request(self, url: str, headers: Optional[dict] = None, stream: bool = False):
+        """One GET with rate limiting, retries and circuit breaking; the caller closes streams."""
+        attempt = 0
+        while True:
+            if self.breaker is not None:
+                self.breaker.wait(url)
+            if self.limiter is not None:
+                self.limiter.acquire(url)
+            if self.retry is not None:
+                self.retry.on_request()
+            try:
+                r = self._send(url, headers, stream)
+            except TRANSIENT_ERRORS:
+                if self.breaker is not None:
+                    self.breaker.record(url, ok=False)
+                delay = self.retry.next_delay(attempt) if self.retry is not None else None
+                if delay is None:
+                    raise
+            else:
+                if self.limiter is not None:
+                    self.limiter.feedback(url, r.status_code, r.headers.get("Retry-After"))
+                if self.breaker is not None:
+                    self.breaker.record(url, ok=r.status_code < 500)
+                delay = None
+                if r.status_code in RETRY_STATUSES and self.retry is not None:
+                    delay = self.retry.next_delay(attempt)
+                if delay is None:
+                    return r
+                r.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, headers: Optional[dict] = None):
+        return self._request(url, headers=headers)
+
+    def fetch(self, url: str) -> FetchResult:
+        """GETs url as text, revalidating against the cache when one is configured."""
+        validators = self.cache.validators(url) if self.cache is not None else {}
+        r = self.get(url, headers=validators or None)
+        if r.status_code == 304 and validators:
+            cached = self.cache.get(url)
+            if cached is not None:
+                body, encoding = cached
+                return FetchResult(body.decode(encoding or "utf-8", errors="replace"), not_modified=True)
+            r = self.get(url)
+        r.raise_for_status()
+        if self.cache is not None:
+            etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+            if etag or last_modified:
+                self.cache.put(url, r.content, etag, last_modified, r.encoding)
+        return FetchResult(r.text)
+
+    @contextmanager
+    def _open_stream(self, url: str, headers: dict, chunk_size: int):
+        """Opens a streaming GET; yields (response, chunk iterator)."""
+        r = self._request(url, headers=headers, stream=True)
+        try:
+            yield r, (r.iter_bytes(chunk_size) if self.http2 else r.iter_content(chunk_size))
+        finally:
+            r.close()
+
+    def stream(self, url: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yields the response body in chunks without holding it in memory."""
+        validators = self.cache.validators(url) if self.cache is not None else {}
+        with self._open_stream(url, validators, chunk_size) as (r, chunks):
+            if not (r.status_code == 304 and validators):
+                r.raise_for_status()
+                etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+                sink = None
+                if self.cache is not None and (etag or last_modified):
+                    sink = self.cache.writer(url, etag, last_modified)
+                try:
+                    for chunk in chunks:
+                        if sink is not None:
+                            sink.write(chunk)
+                        yield chunk
+                except BaseException:
+                    if sink is not None:
+                        sink.abort()
+                    raise
+                if sink is not None:
+                    sink.commit()
+                return
+        # 304 Not Modified: replay the cached body
+        yield from self.cache.iter_body(url, chunk_size)
+
+    def close(self) -> None:
+        """Closes the connection pool and the cache, if any."""
+        self._session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def __enter__(self) -> "HttpClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def fetch_text(url: str, headers: dict, timeout: int = 30, client: Optional[HttpClient] = None) -> str:
+    if client is not None:
+        return client.fetch(url).text
     r = requests.get(url, headers=headers, timeout=timeout)
     r.raise_for_status()
     return r.text
 
 
+def fetch_stream(url: str, headers: dict, timeout: int = 30, client: Optional[HttpClient] = None) -> Iterator[bytes]:
+    if client is not None:
+        yield from client.stream(url)
+        return
+    with requests.get(url, headers=headers, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        yield from r.iter_content(STREAM_CHUNK_SIZE)
+
+
+class AsyncHttpClient:
+    """
+    asyncio HTTP client (httpx.AsyncClient) for --async mode.
+
+    Runs its own event loop on a background thread; submit() schedules a coroutine
+    from synchronous code and returns a concurrent.futures.Future. Up to
+    max_in_flight requests run at once, at most per_host of them per host. The
+    shared HostRateLimiter is honored without blocking the loop.
+    """
+
+    def __init__(
+        self,
+        headers: dict,
+        timeout: int = 30,
+        max_in_flight: int = 200,
+        per_host: int = 16,
+        limiter: Optional[HostRateLimiter] = None,
+        http2: bool = False,
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        if httpx is None:
+            raise RuntimeError("Async mode requires httpx: pip install httpx")
+        self.max_in_flight = max(1, max_in_flight)
+        self.per_host = max(1, per_host)
+        self.limiter = limiter
+        self.retry = retry
+        self.breaker = breaker
+        self._headers = headers
+        self._timeout = timeout
+        self._http2 = http2
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-http", daemon=True)
+        self._thread.start()
+        self._client = None
+        self._in_flight = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.submit(self._open()).result()
+
+    async def _open(self) -> None:
+        self._client = httpx.AsyncClient(
+            http2=self._http2,
+            headers=self._headers,
+            timeout=self._timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.max_in_flight,
+                                max_keepalive_connections=self.max_in_flight),
+        )
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+
+    def submit(self, coro: Awaitable) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        return slot
+
+    async def _throttle(self, url: str) -> None:
+        if self.limiter is not None:
+            wait = self.limiter.reserve(url)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    async def _wait_for_breaker(self, url: str) -> None:
+        while True:
+            wait = self.breaker.delay(url)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def _request(self, url: str, stream: bool = False):
+        """Async HttpClient._request(); the caller closes streamed responses."""
+        attempt = 0
+        while True:
+            if self.breaker is not None:
+                await self._wait_for_breaker(url)
+            await self._throttle(url)
+            if self.retry is not None:
+                self.retry.on_request()
+            try:
+                r = await self._client.send(self._client.build_request("GET", url), stream=stream)
+            except TRANSIENT_ERRORS:
+                if self.breaker is not None:
+                    self.breaker.record(url, ok=False)
+                delay = self.retry.next_delay(attempt) if self.retry is not None else None
+                if delay is None:
+                    raise
+            else:
+                if self.limiter is not None:
+                    self.limiter.feedback(url, r.status_code, r.headers.get("Retry-After"))
+                if self.breaker is not None:
+                    self.breaker.record(url, ok=r.status_code < 500)
+                delay = None
+                if r.status_code in RETRY_STATUSES and self.retry is not None:
+                    delay = self.retry.next_delay(attempt)
+                if delay is None:
+                    return r
+                await r.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def fetch_text(self, url: str) -> str:
+        async with self._in_flight, self._host_slot(url):
+            r = await self._request(url)
+            r.raise_for_status()
+            return r.text
+
+    async def download(self, url: str, fh: BinaryIO) -> None:
+        """Streams the response body into fh."""
+        async with self._in_flight, self._host_slot(url):
+            r = await self._request(url, stream=True)
+            try:
+                r.raise_for_status()
+                async for chunk in r.aiter_bytes(STREAM_CHUNK_SIZE):
+                    fh.write(chunk)
+            finally:
+                await r.aclose()
+
+    def close(self) -> None:
+        if self._client is not None:
+            self.submit(self._client.aclose()).result()
+            self._client = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self) -> "AsyncHttpClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def gunzip_stream(chunks: Iterable[bytes], max_chunk: int = 4 * STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Transparently decompresses gzip data (e.g. sitemap-1.xml.gz) chunk by chunk.
+    Detection is by magic bytes, so plain XML and bodies already decoded via
+    Content-Encoding pass through unchanged. Output chunks are capped at max_chunk.
+    """
+    it = iter(chunks)
+    head = b""
+    for chunk in it:
+        head += chunk
+        if len(head) >= len(GZIP_MAGIC):
+            break
+    if not head.startswith(GZIP_MAGIC):
+        if head:
+            yield head
+        yield from it
+        return
+
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in _chain_first(head, it):
+        data = chunk
+        while data:
+            out = d.decompress(data, max_chunk)
+            if out:
+                yield out
+            if d.eof:
+                # Concatenated gzip members: restart on whatever follows.
+                data = d.unused_data
+                if data:
+                    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                data = d.unconsumed_tail
+    tail = d.flush()
+    if tail:
+        yield tail
+
+
+def _chain_first(first: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+    yield first
+    yield from rest
+
+
+def _local_name(tag) -> str:
+    return etree.QName(tag).localname if isinstance(tag, str) else ""
+
+
+@dataclass
+class SitemapEntry:
+    loc: str
+    kind: str = "url"          # "url" for pages, "sitemap" for sitemapindex children
+    lastmod: str = ""
+    changefreq: str = ""
+    priority: str = ""
+
+
+_ENTRY_FIELDS = ("loc", "lastmod", "changefreq", "priority")
+
+
+def iter_sitemap_entries(chunks: Iterable[bytes]) -> Iterator[SitemapEntry]:
+    """
+    Incrementally parses sitemap XML fed as byte chunks.
+    Yields one SitemapEntry per <url>/<sitemap> element (loc, lastmod, changefreq, priority).
+    Each entry is discarded once read, so memory stays flat for any sitemap size.
+    """
+    parser = etree.XMLPullParser(
+        events=("end",),
+        recover=True,
+        huge_tree=True,
+        resolve_entities=False,
+        no_network=True,
+    )
+
+    def drain() -> Iterator[SitemapEntry]:
+        for _, el in parser.read_events():
+            name = _local_name(el.tag)
+            if name in ("url", "sitemap"):
+                fields = {}
+                for child in el:
+                    child_name = _local_name(child.tag)
+                    if child_name in _ENTRY_FIELDS:
+                        fields[child_name] = (child.text or "").strip()
+                loc = normalize_url(fields.pop("loc", ""))
+                if loc:
+                    yield SitemapEntry(loc=loc, kind=name, **fields)
+                # Free the finished entry and any siblings already processed.
+                el.clear()
+                parent = el.getparent()
+                if parent is not None:
+                    while el.getprevious() is not None:
+                        del parent[0]
+            elif name == "loc":
+                # Bare <loc> outside <url>/<sitemap> (malformed sitemaps)
+                parent = el.getparent()
+                if parent is None or _local_name(parent.tag) not in ("url", "sitemap"):
+                    loc = normalize_url(el.text or "")
+                    if loc:
+                        yield SitemapEntry(loc=loc)
+
+    for chunk in chunks:
+        if chunk:
+            parser.feed(chunk)
+            yield from drain()
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        pass
+    yield from drain()
+
+
+def iter_sitemap_locs(chunks: Iterable[bytes]) -> Iterator[Tuple[str, str]]:
+    """Like iter_sitemap_entries(), yielding (kind, loc) only."""
+    for entry in iter_sitemap_entries(chunks):
+        yield entry.kind, entry.loc
+
+
 def extract_locs_from_xml(xml_text: str) -> List[str]:
-    # Robust enough for most sitemaps without full XML parsing dependency.
-    return re.findall(r"<loc>\s*(.*?)\s*</loc>", xml_text)
+    return [loc for _, loc in iter_sitemap_locs([xml_text.encode("utf-8")])]
 
 
 def is_sitemap_index(xml_text: str) -> bool:
@@ -74,98 +949,906 @@ def normalize_url(u: str) -> str:
     return u.strip()
 
 
+SITEMAP_QUEUE_SIZE = 1000  # parsed entries buffered per in-flight sitemap
+SITEMAP_DONE = None  # last item of every sitemap queue
+
+
+def _put_entry(out: queue.Queue, item, stop: threading.Event) -> bool:
+    """Blocks until out has room; gives up (returns False) once stop is set."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def stream_sitemap_entries(
+    chunks: Iterable[bytes],
+    out: queue.Queue,
+    stop: threading.Event,
+    max_urls: int = 500_000,
+) -> None:
+    """
+    Parses one (possibly gzipped) sitemap body into out, a bounded queue: every entry
+    (kind "sitemap" for child sitemaps, "url" for pages) in document order, then
+    SITEMAP_DONE. Parsing waits while the queue is full, so memory stays flat
+    however large the sitemap; set stop to abandon it.
+    """
+    pages = 0
+    try:
+        for entry in iter_sitemap_entries(gunzip_stream(chunks)):
+            if not _put_entry(out, entry, stop):
+                return
+            if entry.kind != "sitemap":
+                pages += 1
+                if pages >= max_urls:
+                    break
+    finally:
+        _put_entry(out, SITEMAP_DONE, stop)
+
+
+def read_sitemap(
+    sitemap_url: str,
+    headers: dict,
+    out: queue.Queue,
+    stop: threading.Event,
+    client: Optional[HttpClient] = None,
+    max_urls: int = 500_000,
+    async_client: Optional[AsyncHttpClient] = None,
+) -> None:
+    """
+    Fetches and parses one sitemap into out; see stream_sitemap_entries(). With
+    async_client the body is downloaded on its event loop and spooled to a temp file
+    (disk beyond 4 MB), then parsed on the calling thread: a parser waiting for queue
+    room must not hold the loop's default executor, which product extraction needs.
+    """
+    if async_client is None:
+        stream_sitemap_entries(fetch_stream(sitemap_url, headers=headers, client=client), out, stop, max_urls)
+        return
+    with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024) as fh:
+        try:
+            async_client.submit(async_client.download(sitemap_url, fh)).result()
+        except BaseException:
+            _put_entry(out, SITEMAP_DONE, stop)
+            raise
+        fh.seek(0)
+        stream_sitemap_entries(iter(lambda: fh.read(STREAM_CHUNK_SIZE), b""), out, stop, max_urls)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over bytes keys (double hashing on one blake2b digest)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def add(self, key: bytes) -> bool:
+        """Adds key; returns True if it was possibly present already."""
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        bits, m = self._bits, self.num_bits
+        present = True
+        for i in range(self.num_hashes):
+            pos = (h1 + i * h2) % m
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        return present
+
+
+class FingerprintSet:
+    """
+    Set of non-zero 64-bit integers packed in an open-addressed array('Q') table.
+
+    Linear probing, 0 marks an empty slot, and the table doubles at 2/3 load: 12-24
+    bytes per member, against about 70 for a Python set of ints.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        size = 1024
+        while size * 2 < capacity * 3:
+            size *= 2
+        self._table = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, fp: int) -> bool:
+        """Adds fp (non-zero); returns True if it was not present yet."""
+        table, mask = self._table, self._mask
+        i = (fp ^ (fp >> 32)) & mask
+        while True:
+            slot = table[i]
+            if slot == fp:
+                return False
+            if not slot:
+                break
+            i = (i + 1) & mask
+        table[i] = fp
+        self._count += 1
+        if self._count * 3 > len(table) * 2:
+            self._grow()
+        return True
+
+    def _grow(self) -> None:
+        old = self._table
+        self._table = table = array("Q", bytes(16 * len(old)))
+        self._mask = mask = len(table) - 1
+        for fp in old:
+            if fp:
+                i = (fp ^ (fp >> 32)) & mask
+                while table[i]:
+                    i = (i + 1) & mask
+                table[i] = fp
+
+
+class UrlDeduper:
+    """
+    Streaming URL de-duplication that does not keep the URL strings in memory.
+
+    Without a path, seen URLs are kept as 64-bit blake2b fingerprints in a packed
+    FingerprintSet (collision odds are negligible below billions of URLs). With a path, a Bloom filter
+    answers most lookups in memory and an SQLite table holds the exact set, which is
+    consulted only on Bloom hits - suitable for tens of millions of URLs. The store
+    belongs to one run: it is emptied when opened.
+    """
+
+    def __init__(self, path: str = "", capacity: int = 10_000_000, error_rate: float = 0.001):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fingerprints = FingerprintSet()
+        self._bloom: Optional[BloomFilter] = None
+        self._db = None
+        self._uncommitted = 0
+        if path:
+            self._bloom = BloomFilter(capacity, error_rate)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # Start empty: the Bloom filter only knows this run's URLs
+            self._db.execute("DROP TABLE IF EXISTS seen")
+            self._db.execute("CREATE TABLE seen (url TEXT PRIMARY KEY) WITHOUT ROWID")
+            self._db.commit()
+
+    def add(self, url: str) -> bool:
+        """Records url; returns True if it had not been seen before."""
+        key = url.encode("utf-8")
+        with self._lock:
+            if self._db is None:
+                fp = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+                return self._fingerprints.add(fp or 1)
+            if self._bloom.add(key):
+                # Possible duplicate: confirm against the exact store
+                if self._db.execute("SELECT 1 FROM seen WHERE url = ?", (url,)).fetchone():
+                    return False
+            self._db.execute("INSERT OR IGNORE INTO seen (url) VALUES (?)", (url,))
+            self._uncommitted += 1
+            if self._uncommitted >= 1000:
+                self._db.commit()
+                self._uncommitted = 0
+            return True
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+
+class FairExecutor:
+    """
+    Thread pool shared by several producers ("lanes", e.g. one per shop).
+
+    Queued tasks are taken round-robin across lanes, and a lane never has more than
+    lane_limit tasks running, so one large or rate-limited shop cannot occupy the
+    whole pool while the others wait.
+    """
+
+    def __init__(self, max_workers: int, lane_limit: int = 0, thread_name_prefix: str = "fair"):
+        self.lane_limit = max(1, lane_limit or max_workers)
+        self._cond = threading.Condition()
+        self._queues: Dict[str, deque] = {}
+        self._running: Dict[str, int] = {}
+        self._ready: deque = deque()  # lanes with queued tasks, in round-robin order
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{thread_name_prefix}_{i}", daemon=True)
+            for i in range(max(1, max_workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def lane(self, key: str) -> "_FairLane":
+        return _FairLane(self, key)
+
+    def submit_to(self, key: str, fn, *args, **kwargs) -> Future:
+        fut: Future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("cannot submit after shutdown")
+            q = self._queues.setdefault(key, deque())
+            if not q:
+                self._ready.append(key)
+            q.append((fut, fn, args, kwargs))
+            self._cond.notify()
+        return fut
+
+    def _next_task(self):
+        for _ in range(len(self._ready)):
+            key = self._ready.popleft()
+            q = self._queues[key]
+            if self._running.get(key, 0) >= self.lane_limit:
+                self._ready.append(key)
+                continue
+            task = q.popleft()
+            if q:
+                self._ready.append(key)
+            else:
+                del self._queues[key]
+            self._running[key] = self._running.get(key, 0) + 1
+            return key, task
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                item = self._next_task()
+                while item is None:
+                    if self._shutdown and not self._ready:
+                        return
+                    self._cond.wait()
+                    item = self._next_task()
+            key, (fut, fn, args, kwargs) = item
+            if fut.set_running_or_notify_cancel():
+                try:
+                    fut.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    fut.set_exception(e)
+            with self._cond:
+                self._running[key] -= 1
+                if not self._running[key]:
+                    del self._running[key]
+                # A lane that was at its limit may be runnable again
+                self._cond.notify_all()
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        with self._cond:
+            self._shutdown = True
+            if cancel_futures:
+                for q in self._queues.values():
+                    for fut, *_ in q:
+                        fut.cancel()
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+
+class _FairLane(Executor):
+    """Executor view of one FairExecutor lane."""
+
+    def __init__(self, executor: FairExecutor, key: str):
+        self._executor = executor
+        self._key = key
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        return self._executor.submit_to(self._key, fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, **kwargs) -> None:
+        pass  # the shared pool outlives its lanes
+
+
+def iter_sitemap_pages(
+    sitemap_url: Union[str, Iterable[str]],
+    headers: dict,
+    max_sitemaps: int = 500,
+    max_urls: int = 500_000,
+    polite_delay_s: float = 0.0,
+    client: Optional[HttpClient] = None,
+    workers: int = 4,
+    deduper: Optional[UrlDeduper] = None,
+    async_client: Optional[AsyncHttpClient] = None,
+    progress: bool = True,
+    failed: Optional[List[str]] = None,
+) -> Iterator[SitemapEntry]:
+    """
+    Yields page entries (unique by URL) from a sitemap (or several) while each child sitemap
+    is parsed, recursively following sitemapindex children. Pass a shared deduper to
+    de-duplicate across several sitemaps or a disk-backed store. With async_client,
+    sitemaps are downloaded on its event loop and parsed on the sitemap threads.
+    Child sitemaps are fetched concurrently on `workers` threads; results are consumed
+    in discovery order (breadth-first, document order), so output is deterministic.
+    Each fetch holds at most SITEMAP_QUEUE_SIZE parsed entries that are not consumed yet.
+    Sitemaps that cannot be read are skipped with a warning and appended to failed.
+    """
+    workers = max(1, workers)
+    # Readers get threads of their own: one waiting for queue room must never hold a
+    # thread that product fetching needs. They are daemon threads, so a reader stuck
+    # on a slow sitemap does not keep an interrupted process alive.
+    pool = FairExecutor(workers, thread_name_prefix="sitemap")
+    to_visit = deque([sitemap_url] if isinstance(sitemap_url, str) else sitemap_url)
+    visited: Set[str] = set()
+    if deduper is None:
+        deduper = UrlDeduper()
+    yielded = 0
+    pending = deque()
+    stop = threading.Event()
+
+    def read(sm: str, out: queue.Queue) -> None:
+        try:
+            read_sitemap(sm, headers=headers, out=out, stop=stop, client=client, max_urls=max_urls,
+                         async_client=async_client)
+        finally:
+            if polite_delay_s > 0:
+                time.sleep(polite_delay_s)
+
+    def submit(sm: str) -> Tuple[queue.Queue, Future]:
+        # Each fetch streams its entries through a bounded queue: sitemaps behind the
+        # one being consumed pause when their queue fills instead of piling up in memory.
+        out = queue.Queue(maxsize=SITEMAP_QUEUE_SIZE)
+        return out, pool.submit_to("sitemaps", read, sm, out)
+
+    with tqdm(total=0, desc="Sitemaps", unit="sitemap", disable=not progress) as pbar:
+        try:
+            while to_visit or pending:
+                while to_visit and len(pending) < workers:
+                    sm = to_visit.popleft()
+                    if sm in visited:
+                        continue
+                    if len(visited) >= max_sitemaps:
+                        print(f"[WARN] Reached max_sitemaps={max_sitemaps}. Stopping sitemap crawl.", file=sys.stderr)
+                        to_visit.clear()
+                        break
+                    visited.add(sm)
+                    pending.append((sm, *submit(sm)))
+                if not pending:
+                    break
+
+                sm, out, fut = pending.popleft()
+                found = 0
+                for entry in iter(out.get, SITEMAP_DONE):
+                    found += 1
+                    if entry.kind == "sitemap":
+                        # locs here are other sitemap URLs
+                        if entry.loc not in visited:
+                            to_visit.append(entry.loc)
+                        continue
+                    if not deduper.add(entry.loc):
+                        continue
+                    yield entry
+                    yielded += 1
+                    if yielded >= max_urls:
+                        print(f"[WARN] Reached max_urls={max_urls}. Truncating.", file=sys.stderr)
+                        return
+                try:
+                    fut.result()
+                except Exception as e:
+                    print(f"[WARN] Failed to fetch sitemap: {sm} ({e})", file=sys.stderr)
+                    if failed is not None:
+                        failed.append(sm)
+                    continue
+
+                if found:
+                    pbar.total = len(visited) + len(to_visit)
+                    pbar.update(1)
+        finally:
+            stop.set()
+            for _, _, f in pending:
+                f.cancel()
+            pool.shutdown()
+
+
+def iter_sitemap_urls(
+    sitemap_url: str,
+    headers: dict,
+    max_sitemaps: int = 500,
+    max_urls: int = 500_000,
+    polite_delay_s: float = 0.0,
+    client: Optional[HttpClient] = None,
+    workers: int = 4,
+) -> Iterator[str]:
+    """Like iter_sitemap_pages(), yielding page URLs only."""
+    pages = iter_sitemap_pages(
+        sitemap_url,
+        headers=headers,
+        max_sitemaps=max_sitemaps,
+        max_urls=max_urls,
+        polite_delay_s=polite_delay_s,
+        client=client,
+        workers=workers,
+    )
+    try:
+        for entry in pages:
+            yield entry.loc
+    finally:
+        pages.close()
+
+
 def crawl_sitemap_tree(
     sitemap_url: str,
     headers: dict,
     max_sitemaps: int = 500,
     max_urls: int = 500_000,
     polite_delay_s: float = 0.0,
+    client: Optional[HttpClient] = None,
+    workers: int = 4,
 ) -> List[str]:
     """
     Returns ALL loc URLs from a sitemap, recursively following sitemapindex children.
     """
-    to_visit = [sitemap_url]
-    visited: Set[str] = set()
-    all_urls: List[str] = []
+    return list(iter_sitemap_urls(
+        sitemap_url,
+        headers=headers,
+        max_sitemaps=max_sitemaps,
+        max_urls=max_urls,
+        polite_delay_s=polite_delay_s,
+        client=client,
+        workers=workers,
+    ))
 
-    with tqdm(total=0, desc="Sitemaps", unit="sitemap") as pbar:
-        while to_visit:
-            sm = to_visit.pop()
-            if sm in visited:
-                continue
-            visited.add(sm)
-            if len(visited) > max_sitemaps:
-                print(f"[WARN] Reached max_sitemaps={max_sitemaps}. Stopping sitemap crawl.", file=sys.stderr)
-                break
 
-            try:
-                xml = fetch_text(sm, headers=headers)
-            except Exception as e:
-                print(f"[WARN] Failed to fetch sitemap: {sm} ({e})", file=sys.stderr)
-                continue
+class _PatternGroup:
+    """
+    One FilterConfig field compiled for matching.
+    Plain keywords are case-insensitive substrings of the whole URL, folded into a
+    single alternation regex. 're:<regex>' (searched) and 'glob:<pattern>' (full
+    match) are tested against each URL path segment.
+    """
 
-            locs = [normalize_url(x) for x in extract_locs_from_xml(xml)]
-            if not locs:
+    def __init__(self, patterns: Iterable[str]):
+        substrings: List[str] = []
+        self.segment_patterns: List["re.Pattern[str]"] = []
+        for p in patterns:
+            p = (p or "").strip()
+            if not p:
                 continue
-
-            if is_sitemap_index(xml):
-                # locs here are other sitemap URLs
-                for child in locs:
-                    if child not in visited:
-                        to_visit.append(child)
-                pbar.total = len(visited) + len(to_visit)
-                pbar.update(1)
+            if p.startswith("re:"):
+                self.segment_patterns.append(re.compile(p[3:], re.IGNORECASE))
+            elif p.startswith("glob:"):
+                # translate() anchors the end; "^" anchors the start, so search() == full match
+                self.segment_patterns.append(re.compile("^" + fnmatch.translate(p[5:]), re.IGNORECASE))
             else:
-                # locs here are page URLs
-                all_urls.extend(locs)
-                if len(all_urls) >= max_urls:
-                    print(f"[WARN] Reached max_urls={max_urls}. Truncating.", file=sys.stderr)
-                    all_urls = all_urls[:max_urls]
-                    break
-                pbar.total = len(visited) + len(to_visit)
-                pbar.update(1)
+                substrings.append(p.lower())
+        self.substring_re = re.compile("|".join(map(re.escape, substrings))) if substrings else None
+
+    def __bool__(self) -> bool:
+        return self.substring_re is not None or bool(self.segment_patterns)
+
+    def matches(self, lower_url: str, segments: List[str]) -> bool:
+        if self.substring_re is not None and self.substring_re.search(lower_url):
+            return True
+        for pat in self.segment_patterns:
+            for seg in segments:
+                if pat.search(seg):
+                    return True
+        return False
+
+
+class UrlFilter:
+    """FilterConfig compiled once; use matches() per URL or filter() over a URL stream."""
+
+    def __init__(self, fc: FilterConfig):
+        marker = _PatternGroup([fc.product_marker] if fc.product_marker else [])
+        include = _PatternGroup(fc.include_keywords or [])
+        must_any = _PatternGroup(fc.must_contain_any or [])
+        exclude = _PatternGroup(fc.exclude_keywords or [])
+        # (group, required) in the same order as the original checks
+        self._checks = [(g, req) for g, req in ((marker, True), (include, True), (must_any, True), (exclude, False)) if g]
+        self._needs_segments = any(g.segment_patterns for g, _ in self._checks)
+
+    def matches(self, url: str) -> bool:
+        u = url.lower()
+        segments = [x for x in urlparse(url).path.split("/") if x] if self._needs_segments else []
+        for group, required in self._checks:
+            if group.matches(u, segments) != required:
+                return False
+        return True
+
+    def filter(self, urls: Iterable[str]) -> Iterator[str]:
+        matches = self.matches
+        return (u for u in urls if matches(u))
+
+
+_URL_FILTER_CACHE: Dict[Tuple, UrlFilter] = {}
+
+
+def compile_url_filter(fc: FilterConfig) -> UrlFilter:
+    """Cached UrlFilter for fc (keyed by its field values)."""
+    key = (
+        fc.product_marker,
+        tuple(fc.include_keywords or ()),
+        tuple(fc.exclude_keywords or ()),
+        tuple(fc.must_contain_any or ()),
+    )
+    uf = _URL_FILTER_CACHE.get(key)
+    if uf is None:
+        if len(_URL_FILTER_CACHE) >= 64:
+            _URL_FILTER_CACHE.clear()
+        uf = _URL_FILTER_CACHE[key] = UrlFilter(fc)
+    return uf
 
-            if polite_delay_s > 0:
-                time.sleep(polite_delay_s)
 
-    # Deduplicate while preserving order
-    seen: Set[str] = set()
-    deduped: List[str] = []
-    for u in all_urls:
-        if u not in seen:
-            seen.add(u)
-            deduped.append(u)
-    return deduped
+def url_passes_filters(url: str, fc: FilterConfig) -> bool:
+    return compile_url_filter(fc).matches(url)
 
 
-def url_passes_filters(url: str, fc: FilterConfig) -> bool:
-    u = url.lower()
+class RobotsRules:
+    """
+    Parsed robots.txt for one origin: the Allow/Disallow rules of the group that
+    applies to us, its Crawl-delay, and every Sitemap: line.
 
-    if fc.product_marker:
-        if fc.product_marker.lower() not in u:
-            return False
+    Plain path prefixes live in a character trie, so allowed() costs one walk over
+    the path; only rules with * or $ are matched as regexes. As in RFC 9309 the
+    longest matching rule wins and Allow wins ties.
+    """
 
-    if fc.include_keywords:
-        # If include_keywords set: require ANY include keyword
-        if not any(k.lower() in u for k in fc.include_keywords):
-            return False
+    def __init__(self):
+        self.sitemaps: List[str] = []
+        self.crawl_delay: Optional[float] = None
+        self._trie: Dict[str, dict] = {}
+        self._wildcards: List[Tuple[re.Pattern, int, bool]] = []
+
+    @classmethod
+    def parse(cls, text: str, agent: str) -> "RobotsRules":
+        agent = agent.lower()
+        rules = cls()
+        groups: List[Tuple[List[str], List[Tuple[str, str]]]] = []
+        in_agents = False
+        for line in text.splitlines():
+            field, sep, value = line.split("#", 1)[0].partition(":")
+            if not sep:
+                continue
+            field, value = field.strip().lower(), value.strip()
+            if field == "user-agent":
+                if not in_agents:
+                    groups.append(([], []))
+                groups[-1][0].append(value.lower())
+                in_agents = True
+                continue
+            in_agents = False
+            if field == "sitemap":
+                # Sitemap lines are global and do not end the current group
+                if value:
+                    rules.sitemaps.append(value)
+            elif groups and field in ("allow", "disallow", "crawl-delay"):
+                groups[-1][1].append((field, value))
+
+        ours = [g for g in groups if any(a != "*" and a in agent for a in g[0] if a)]
+        chosen = ours or [g for g in groups if "*" in g[0]]
+        for _, lines in chosen:
+            for field, value in lines:
+                if field == "crawl-delay":
+                    try:
+                        rules.crawl_delay = max(0.0, float(value))
+                    except ValueError:
+                        pass
+                elif value:
+                    rules._add(value, allow=(field == "allow"))
+        return rules
+
+    def _add(self, pattern: str, allow: bool) -> None:
+        if "*" in pattern or pattern.endswith("$"):
+            anchored = pattern.endswith("$")
+            body = pattern[:-1] if anchored else pattern
+            regex = ".*".join(re.escape(part) for part in body.split("*")) + ("$" if anchored else "")
+            self._wildcards.append((re.compile(regex), len(pattern), allow))
+            return
+        node = self._trie
+        for ch in pattern:
+            node = node.setdefault(ch, {})
+        # "" marks the end of a rule; Allow wins over an identical Disallow
+        node[""] = node.get("", False) or allow
+
+    def allowed(self, url: str) -> bool:
+        parts = urlparse(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        best_len, best_allow = 0, True
+        node = self._trie
+        for i, ch in enumerate(path, 1):
+            node = node.get(ch)
+            if node is None:
+                break
+            if "" in node:
+                best_len, best_allow = i, node[""]
+        for regex, length, allow in self._wildcards:
+            if (length > best_len or (length == best_len and allow)) and regex.match(path):
+                best_len, best_allow = length, allow
+        return best_allow
 
-    if fc.must_contain_any:
-        if not any(k.lower() in u for k in fc.must_contain_any):
-            return False
 
-    if fc.exclude_keywords:
-        if any(k.lower() in u for k in fc.exclude_keywords):
-            return False
+class RobotsCache:
+    """
+    Fetches and parses robots.txt once per origin (scheme + host), thread-safe.
+    A missing robots.txt (4xx) allows everything; so does one that cannot be
+    fetched, with a warning, so a flaky robots.txt does not stop the export.
+    """
 
-    return True
+    MAX_BYTES = 512 * 1024
+
+    def __init__(self, client: HttpClient, agent: str = "CatalogExporter"):
+        self.client = client
+        self.agent = agent
+        self._lock = threading.Lock()
+        self._origins: Dict[str, Future] = {}
+
+    def rules(self, url: str) -> RobotsRules:
+        parts = urlparse(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            fut = self._origins.get(origin)
+            owner = fut is None
+            if owner:
+                fut = self._origins[origin] = Future()
+        if owner:
+            fut.set_result(self._load(origin))
+        return fut.result()
+
+    def _load(self, origin: str) -> RobotsRules:
+        try:
+            r = self.client.get(f"{origin}/robots.txt")
+        except Exception as e:
+            print(f"[WARN] Failed to fetch {origin}/robots.txt ({e}); assuming everything is allowed.", file=sys.stderr)
+            return RobotsRules()
+        try:
+            if r.status_code >= 500:
+                print(f"[WARN] {origin}/robots.txt returned {r.status_code}; assuming everything is allowed.",
+                      file=sys.stderr)
+                return RobotsRules()
+            if r.status_code >= 400:
+                return RobotsRules()
+            return RobotsRules.parse(r.text[:self.MAX_BYTES], self.agent)
+        finally:
+            r.close()
+
+    def allowed(self, url: str) -> bool:
+        return self.rules(url).allowed(url)
+
+    def sitemaps(self, url: str) -> List[str]:
+        return self.rules(url).sitemaps
+
+    def crawl_rate(self, url: str, rate: float, explicit: bool = False) -> float:
+        """
+        Requests/second for url's host: robots.txt Crawl-delay replaces the delay-derived
+        rate; an explicit --rate is kept but capped by it.
+        """
+        delay = self.rules(url).crawl_delay
+        if not delay:
+            return rate
+        robots_rate = 1.0 / delay
+        return min(rate, robots_rate) if explicit and rate > 0 else robots_rate
+
+
+def normalize_site_url(url: str) -> str:
+    """A shop or sitemap URL as typed ("shop.com"), with https:// added when it has no scheme."""
+    url = url.strip()
+    return url if "://" in url else f"https://{url}"
+
+
+def resolve_sitemap_urls(url: str, robots: Optional[RobotsCache] = None) -> List[str]:
+    """
+    A sitemap URL is used as is. For a bare site URL (no path) the sitemaps come from
+    robots.txt Sitemap: lines, falling back to /sitemap.xml.
+    """
+    url = normalize_site_url(url)
+    parts = urlparse(url)
+    if parts.path not in ("", "/"):
+        return [url]
+    found = robots.sitemaps(url) if robots is not None else []
+    return found or [f"{parts.scheme}://{parts.netloc}/sitemap.xml"]
+
+
+_WS_RE = re.compile(r"\s+")
 
 
 def clean_text(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").strip())
+    return _WS_RE.sub(" ", (s or "").strip())
 
 
-def extract_title(soup: BeautifulSoup) -> str:
+# Price parsing: all patterns are compiled once at import.
+CURRENCY_SYMBOLS = {
+    "R$": "BRL", "zł": "PLN", "€": "EUR", "£": "GBP", "$": "USD", "¥": "JPY", "₹": "INR", "₽": "RUB", "₺": "TRY",
+    "₩": "KRW", "₴": "UAH",
+}
+CURRENCY_CODES = ["EUR", "USD", "GBP", "CHF", "PLN", "SEK", "NOK", "DKK", "CZK", "HUF", "JPY", "CAD", "AUD", "UAH"]
+
+# 1.234,56 / 1,234.56 / 1 234,56 / 1'234.50 / 12,- / 0.99; a leading group of 1-3 digits
+# followed by 3-digit groups is read as thousands, the trailing [.,]digits as decimals.
+# A plain space only counts as a separator when cents follow ("1 234,56"); otherwise it
+# would glue neighbouring numbers together ("€ 9 100 in stock" is 9, not 9100).
+_SPACED_INT = r"[1-9]\d{0,2}(?: \d{3})+(?=[.,]\d{2}(?!\d))"
+_NUMBER = rf"(?:{_SPACED_INT}|[1-9]\d{{0,2}}(?:[.,'\u00a0\u202f]\d{{3}})+|\d+)(?:[.,]\d+)?"
+_CURRENCY = "|".join(
+    [re.escape(sym) for sym in sorted(CURRENCY_SYMBOLS, key=len, reverse=True)]
+    + [rf"\b{code}\b" for code in CURRENCY_CODES]
+)
+_RANGE_SEP = r"\s*(?:-|–|—|to|tot|bis)\s*"
+_NUMBER_RE = re.compile(rf"(?P<int>{_SPACED_INT}|[1-9]\d{{0,2}}(?:[.,'\u00a0\u202f]\d{{3}})+|\d+)(?:(?P<sep>[.,])(?P<frac>\d+))?")
+# Prices are found by locating currency tokens first and then matching the amount right
+# after or right before them; a regex scan for numbers or for the token alternation is
+# far slower on long pages. Symbols are located by their last character with str.find
+# (a memchr scan); ISO codes are only searched when no symbol has an amount next to it.
+_SYMBOL_ANCHORS: Dict[str, List[str]] = {}
+for _sym in sorted(CURRENCY_SYMBOLS, key=len, reverse=True):
+    _SYMBOL_ANCHORS.setdefault(_sym[-1], []).append(_sym)
+_AMOUNT_AFTER_RE = re.compile(rf"\s*(?P<low>{_NUMBER})(?:{_RANGE_SEP}(?:{_CURRENCY})?\s*(?P<high>{_NUMBER}))?")
+_AMOUNT_BEFORE_RE = re.compile(rf"(?<![\d.,])(?P<low>{_NUMBER})(?:{_RANGE_SEP}(?P<high>{_NUMBER}))?\s*$")
+_AMOUNT_WINDOW = 48
+_THOUSANDS_SEPARATORS = str.maketrans("", "", ".,' \u00a0\u202f")
+
+
+@dataclass
+class PriceMatch:
+    amount: float
+    currency: str
+    high: Optional[float] = None  # upper bound of a price range ("€10 - €20")
+
+
+def parse_number(text: str) -> Optional[float]:
+    """First number in text, with thousands separators removed (1.234,56 and 1,234.56 -> 1234.56)."""
+    m = _NUMBER_RE.search(text or "")
+    if not m:
+        return None
+    digits = m.group("int").translate(_THOUSANDS_SEPARATORS)
+    frac = m.group("frac")
+    return float(f"{digits}.{frac}") if frac else float(digits)
+
+
+def _currency_code(symbol: str) -> str:
+    return CURRENCY_SYMBOLS.get(symbol, symbol.upper())
+
+
+def _symbol_tokens(text: str) -> List[Tuple[int, str]]:
+    """(offset, symbol) of currency symbols in text order; "R$" wins over its "$"."""
+    hits = []
+    for anchor, symbols in _SYMBOL_ANCHORS.items():
+        i = text.find(anchor)
+        while i != -1:
+            for sym in symbols:
+                start = i + 1 - len(sym)
+                if start >= 0 and text.startswith(sym, start):
+                    hits.append((start, sym))
+                    break
+            i = text.find(anchor, i + 1)
+    hits.sort()
+    return hits
+
+
+def _code_tokens(text: str) -> List[Tuple[int, str]]:
+    """(offset, code) of whole-word ISO currency codes in text order ("EUR" but not "EURO")."""
+    hits = []
+    for code in CURRENCY_CODES:
+        i = text.find(code)
+        while i != -1:
+            stop = i + len(code)
+            if not (i and text[i - 1].isalnum()) and not (stop < len(text) and text[stop].isalnum()):
+                hits.append((i, code))
+            i = text.find(code, stop)
+    hits.sort()
+    return hits
+
+
+def find_price(text: str) -> Optional[PriceMatch]:
+    """
+    First amount next to a currency symbol in text, e.g. "€ 1.299,-" or "10 - 20 $";
+    amounts next to ISO codes ("19,95 EUR") are used when no symbol has one.
+    """
+    text = text or ""
+    for tokens in (_symbol_tokens, _code_tokens):
+        for start, token in tokens(text):
+            m = _AMOUNT_AFTER_RE.match(text, start + len(token))
+            if m is None:
+                m = _AMOUNT_BEFORE_RE.search(text, max(0, start - _AMOUNT_WINDOW), start)
+            if m is not None:
+                high = m.group("high")
+                return PriceMatch(parse_number(m.group("low")), _currency_code(token),
+                                  parse_number(high) if high else None)
+    return None
+
+
+class PageContext:
+    """
+    A parsed product page shared by all extractors.
+    The visible text (and its lowercase form) is built once, on first use.
+    """
+
+    def __init__(self, soup: BeautifulSoup):
+        self.soup = soup
+
+    @classmethod
+    def from_html(cls, html: str) -> "PageContext":
+        return cls(BeautifulSoup(html, "lxml"))
+
+    @cached_property
+    def text(self) -> str:
+        # Same as soup.get_text(" ", strip=True); the walk also records where each text node starts
+        return " ".join(s.strip() for s in self._text_nodes[1])
+
+    @cached_property
+    def lower_text(self) -> str:
+        return self.text.lower()
+
+    @cached_property
+    def price_match(self) -> Optional[PriceMatch]:
+        return find_price(self.text)
+
+    @cached_property
+    def _text_nodes(self) -> Tuple[List[int], List[NavigableString]]:
+        """Start offset in self.text of each non-blank text node, and the nodes."""
+        starts: List[int] = []
+        nodes: List[NavigableString] = []
+        pos = 0
+        for s in self.soup.strings:
+            t = s.strip()
+            if t:
+                starts.append(pos)
+                nodes.append(s)
+                pos += len(t) + 1
+        return starts, nodes
+
+    def node_at(self, offset: int) -> Optional[NavigableString]:
+        """The text node that holds an offset in self.text."""
+        starts, nodes = self._text_nodes
+        i = bisect_right(starts, offset) - 1
+        return nodes[i] if i >= 0 else None
+
+    def zone_at(self, offset: int) -> str:
+        """"buy_box", "footer" (footer, nav, aside, header) or "main" for an offset in self.text."""
+        node = self.node_at(offset)
+        return self._zone_of(node.parent) if node is not None and node.parent is not None else "main"
+
+    @cached_property
+    def _zones(self) -> Dict[int, str]:
+        return {}
+
+    def _zone_of(self, el: Tag) -> str:
+        # A buy box anywhere above wins over boilerplate; memoized per element, as hits share ancestors
+        zone = self._zones.get(id(el))
+        if zone is None:
+            if is_buy_box(el):
+                zone = "buy_box"
+            else:
+                zone = self._zone_of(el.parent) if el.parent is not None else "main"
+                if zone == "main" and is_boilerplate(el):
+                    zone = "footer"
+            self._zones[id(el)] = zone
+        return zone
+
+    def in_control(self, offset: int) -> bool:
+        """True if an offset in self.text is part of a button or link label ("Add to cart")."""
+        node = self.node_at(offset)
+        return node is not None and node.parent is not None and self._control_of(node.parent)
+
+    @cached_property
+    def _controls(self) -> Dict[int, bool]:
+        return {}
+
+    def _control_of(self, el: Tag) -> bool:
+        # Memoized per element like _zone_of: a product grid repeats its button labels hundreds of times
+        control = self._controls.get(id(el))
+        if control is None:
+            control = el.name in ("button", "a") or el.get("role") == "button" or (
+                el.parent is not None and self._control_of(el.parent))
+            self._controls[id(el)] = control
+        return control
+
+
+PageLike = Union[BeautifulSoup, PageContext]
+
+
+def as_page(page: PageLike) -> PageContext:
+    return page if isinstance(page, PageContext) else PageContext(page)
+
+
+def extract_title(page: PageLike) -> str:
+    soup = as_page(page).soup
     h1 = soup.find("h1")
     if h1:
         return clean_text(h1.get_text())
@@ -178,40 +1861,31 @@ def extract_title(soup: BeautifulSoup) -> str:
     return ""
 
 
-def extract_price(soup: BeautifulSoup) -> Optional[float]:
+def extract_price(page: PageLike) -> Optional[float]:
+    page = as_page(page)
+    soup = page.soup
     # 1) schema.org price
     meta_price = soup.select_one('[itemprop="price"]')
     if meta_price:
-        content = meta_price.get("content") or meta_price.get_text()
-        if content:
-            m = re.search(r"([0-9]+(?:[.,][0-9]{2})?)", content)
-            if m:
-                try:
-                    return float(m.group(1).replace(",", "."))
-                except:
-                    pass
+        price = parse_number(meta_price.get("content") or meta_price.get_text())
+        if price is not None:
+            return price
 
     # 2) meta property product:price:amount (OpenGraph)
     ogp = soup.select_one('meta[property="product:price:amount"]')
     if ogp and ogp.get("content"):
-        try:
-            return float(ogp["content"].replace(",", "."))
-        except:
-            pass
-
-    # 3) visible €/$/£ price
-    text = soup.get_text(" ", strip=True)
-    m = re.search(r"(€|\$|£)\s*([0-9]+(?:[.,][0-9]{2})?)", text)
-    if m:
-        try:
-            return float(m.group(2).replace(",", "."))
-        except:
-            pass
+        price = parse_number(ogp["content"])
+        if price is not None:
+            return price
 
-    return None
+    # 3) visible price next to a currency symbol or code
+    match = page.price_match
+    return match.amount if match is not None else None
 
 
-def extract_currency(soup: BeautifulSoup) -> str:
+def extract_currency(page: PageLike) -> str:
+    page = as_page(page)
+    soup = page.soup
     # Best-effort: check currency meta
     meta = soup.select_one('[itemprop="priceCurrency"]')
     if meta:
@@ -219,8 +1893,10 @@ def extract_currency(soup: BeautifulSoup) -> str:
     ogc = soup.select_one('meta[property="product:price:currency"]')
     if ogc and ogc.get("content"):
         return clean_text(ogc["content"])
-    # fallback: detect common symbols in page text
-    t = soup.get_text(" ", strip=True)
+    # fallback: the currency of the first visible price, then any common symbol
+    if page.price_match is not None:
+        return page.price_match.currency
+    t = page.text
     if "€" in t:
         return "EUR"
     if "$" in t:
@@ -230,13 +1906,350 @@ def extract_currency(soup: BeautifulSoup) -> str:
     return ""
 
 
-def extract_stock_status(soup: BeautifulSoup) -> str:
-    t = soup.get_text(" ", strip=True).lower()
-    if any(p in t for p in OUT_OF_STOCK_PHRASES):
-        return "out_of_stock"
-    if any(p in t for p in IN_STOCK_PHRASES):
-        return "in_stock"
-    return ""
+# Page areas for stock phrases, told apart by walking up from the text node of a hit
+BUY_BOX_MARKERS = ("add-to-cart", "buy-box")  # in a class or id
+BOILERPLATE_TAGS = ("footer", "nav", "aside", "header")
+BOILERPLATE_ROLES = ("contentinfo", "navigation")
+
+
+def _looks_like_buy_box(el: Tag) -> bool:
+    classes = " ".join(el.get("class") or ())
+    ident = el.get("id") or ""
+    return (
+        el.get("itemprop") == "offers"
+        or (el.name == "form" and "cart" in (el.get("action") or ""))
+        or "product-form" in classes
+        or any(marker in classes or marker in ident for marker in BUY_BOX_MARKERS)
+    )
+
+
+def is_buy_box(el: Tag) -> bool:
+    """The offer/add-to-cart area, or the container of an add-to-cart button (which holds the stock label)."""
+    if _looks_like_buy_box(el):
+        return True
+    return any(
+        child.name in ("button", "a", "input") and _looks_like_buy_box(child)
+        for child in el.contents if isinstance(child, Tag)
+    )
+
+
+def is_boilerplate(el: Tag) -> bool:
+    return el.name in BOILERPLATE_TAGS or el.get("role") in BOILERPLATE_ROLES
+
+
+STOCK_ZONE_RANK = {"buy_box": 0, "main": 1, "footer": 2}
+
+
+@dataclass
+class StockMatch:
+    status: str  # "in_stock" or "out_of_stock"
+    phrase: str
+    offset: int  # in PageContext.text
+    zone: str  # "buy_box", "main" or "footer"
+
+    def describe(self) -> str:
+        return f'"{self.phrase}" ({self.zone}, offset {self.offset})'
+
+
+class StockPhraseMatcher:
+    """
+    Finds stock phrases (case-insensitive, whole words) in lowercase page text.
+
+    Built once per phrase set. With pyahocorasick installed all phrases are found in
+    one pass over the text, whatever the number of phrases; without it each phrase is
+    one C-level str.find scan, which for packs of a few dozen phrases is still faster
+    than a Python regex alternation.
+    """
+
+    def __init__(self, phrases: Dict[str, Iterable[str]]):
+        self.status: Dict[str, str] = {}
+        for status in ("in_stock", "out_of_stock"):  # a phrase listed under both counts as out of stock
+            for phrase in phrases.get(status, ()):
+                phrase = clean_text(phrase).lower()
+                if phrase:
+                    self.status[phrase] = status
+        self._automaton = None
+        if ahocorasick is not None and self.status:
+            self._automaton = ahocorasick.Automaton()
+            for phrase in self.status:
+                self._automaton.add_word(phrase, phrase)
+            self._automaton.make_automaton()
+
+    def _occurrences(self, text: str) -> Iterator[Tuple[int, str]]:
+        if self._automaton is not None:
+            for end, phrase in self._automaton.iter(text):
+                yield end + 1 - len(phrase), phrase
+            return
+        for phrase in self.status:
+            i = text.find(phrase)
+            while i != -1:
+                yield i, phrase
+                i = text.find(phrase, i + 1)
+
+    def find_all(self, text: str) -> List[Tuple[int, str, str]]:
+        """(offset, phrase, status) in text order; of overlapping phrases the longest wins."""
+        found = []
+        end = 0
+        for start, phrase in sorted(self._occurrences(text), key=lambda hit: (hit[0], -len(hit[1]))):
+            if start < end:
+                continue  # "in stock" inside "not in stock"
+            stop = start + len(phrase)
+            if (start and text[start - 1].isalnum()) or (stop < len(text) and text[stop].isalnum()):
+                continue  # "available" inside "unavailable"
+            found.append((start, phrase, self.status[phrase]))
+            end = stop
+        return found
+
+
+_stock_phrases: Tuple[Dict[str, Dict[str, List[str]]], List[str]] = (STOCK_PHRASE_PACKS, [])
+_stock_matcher = StockPhraseMatcher({"out_of_stock": OUT_OF_STOCK_PHRASES, "in_stock": IN_STOCK_PHRASES})
+
+
+def load_stock_phrase_packs(path: str) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Reads phrase packs from JSON: {"de": {"out_of_stock": [...], "in_stock": [...]}, ...}.
+    They are added to the built-in packs; a locale in the file replaces the built-in one.
+    """
+    try:
+        with open(path, encoding="utf-8") as fh:
+            raw = json.load(fh)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Cannot read stock phrases file {path}: {e}")
+    if not isinstance(raw, dict):
+        raise SystemExit(f"Stock phrases file {path} must map locales to phrase lists.")
+    packs = dict(STOCK_PHRASE_PACKS)
+    for locale, pack in raw.items():
+        if not isinstance(pack, dict) or set(pack) - {"out_of_stock", "in_stock"} or not all(
+            isinstance(v, list) for v in pack.values()
+        ):
+            raise SystemExit(f'Stock phrases file {path}: "{locale}" needs "out_of_stock"/"in_stock" lists.')
+        packs[locale.lower()] = {status: [str(p) for p in pack.get(status, [])] for status in ("out_of_stock", "in_stock")}
+    return packs
+
+
+def configure_stock_phrases(packs: Dict[str, Dict[str, List[str]]], locales: Optional[List[str]] = None) -> None:
+    """Rebuilds the stock phrase matcher from the given packs (all of them, or only locales)."""
+    global _stock_phrases, _stock_matcher
+    locales = [loc.lower() for loc in locales or []]
+    unknown = [loc for loc in locales if loc not in packs]
+    if unknown:
+        raise SystemExit(f"Unknown locale(s) {', '.join(unknown)}; available: {', '.join(sorted(packs))}")
+    chosen = [packs[loc] for loc in locales] if locales else list(packs.values())
+    _stock_phrases = (packs, locales)
+    _stock_matcher = StockPhraseMatcher({
+        status: [p for pack in chosen for p in pack.get(status, [])] for status in ("out_of_stock", "in_stock")
+    })
+
+
+def find_stock_match(page: PageLike) -> Optional[StockMatch]:
+    """
+    The most telling stock phrase on the page. Stock labels beat button and link
+    labels ("add to cart" stays on the page of a sold-out product, often just
+    disabled); then matches in the buy box beat the main content, which beats
+    footer/nav boilerplate; within a zone "out of stock" wins.
+    """
+    page = as_page(page)
+    hits = _stock_matcher.find_all(page.lower_text)
+    if not hits:
+        return None
+    best = None
+    # Out-of-stock hits first: once a label outside the footer is found, button and link
+    # labels cannot beat it, so the zones of the many "add to cart"s in a product grid
+    # are never looked up
+    for offset, phrase, status in sorted(hits, key=lambda hit: hit[2] != "out_of_stock"):
+        control = page.in_control(offset)
+        if control and best is not None and not best[0][0] and not best[0][1]:
+            continue
+        zone = page.zone_at(offset)
+        key = (zone == "footer", control, STOCK_ZONE_RANK[zone], status != "out_of_stock", offset)
+        if best is None or key < best[0]:
+            best = (key, StockMatch(status, phrase, offset, zone))
+    return best[1]
+
+
+def stock_status_from_match(match: Optional[StockMatch]) -> str:
+    # Footer/nav text (shipping notes, other products) says nothing about this product
+    if match is None or match.zone == "footer":
+        return ""
+    return match.status
+
+
+def extract_stock_status(page: PageLike) -> str:
+    return stock_status_from_match(find_stock_match(page))
+
+
+# ---------------------------------------------------------------------------
+# Fast path: structured data (JSON-LD, itemprop, og:/product: meta) via regex,
+# without building a BeautifulSoup tree.
+# ---------------------------------------------------------------------------
+
+_JSONLD_RE = re.compile(
+    r"<script[^>]+type\s*=\s*[\"']?application/ld\+json[\"']?[^>]*>(.*?)</script>",
+    re.IGNORECASE | re.DOTALL,
+)
+_META_TAG_RE = re.compile(r"<meta\s[^>]*>", re.IGNORECASE)
+_ITEMPROP_TAG_RE = re.compile(
+    r"<[a-z]+\s[^>]*\bitemprop\s*=\s*[\"']?(price|pricecurrency|availability)\b[^>]*>",
+    re.IGNORECASE,
+)
+_ATTR_RE = re.compile(r"([a-zA-Z_:-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))")
+_HEAD_END_RE = re.compile(r"</head\s*>", re.IGNORECASE)
+_H1_RE = re.compile(r"<h1\b[^>]*>(.*?)</h1\s*>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+_AVAILABILITY_STOCK = {
+    "instock": "in_stock",
+    "in stock": "in_stock",
+    "onlineonly": "in_stock",
+    "instoreonly": "in_stock",
+    "limitedavailability": "in_stock",
+    "preorder": "in_stock",
+    "presale": "in_stock",
+    "backorder": "in_stock",
+    "outofstock": "out_of_stock",
+    "out of stock": "out_of_stock",
+    "oos": "out_of_stock",
+    "soldout": "out_of_stock",
+    "discontinued": "out_of_stock",
+}
+
+
+@dataclass
+class StructuredProduct:
+    title: str = ""
+    price: Optional[float] = None
+    currency: str = ""
+    stock: str = ""
+
+
+def _tag_attrs(tag: str) -> Dict[str, str]:
+    return {
+        m.group(1).lower(): unescape(m.group(2) if m.group(2) is not None else (m.group(3) or m.group(4) or ""))
+        for m in _ATTR_RE.finditer(tag)
+    }
+
+
+def _parse_price_value(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return parse_number(str(value or ""))
+
+
+def _parse_availability(value) -> str:
+    v = str(value or "").strip().lower().rsplit("/", 1)[-1]
+    return _AVAILABILITY_STOCK.get(v, "")
+
+
+def _iter_jsonld_nodes(data) -> Iterator[dict]:
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_jsonld_nodes(item)
+    elif isinstance(data, dict):
+        yield data
+        if "@graph" in data:
+            yield from _iter_jsonld_nodes(data["@graph"])
+
+
+def _is_type(node: dict, name: str) -> bool:
+    t = node.get("@type")
+    types = t if isinstance(t, list) else [t]
+    return any(isinstance(x, str) and x.rsplit("/", 1)[-1] == name for x in types)
+
+
+def _apply_jsonld_product(product: dict, out: StructuredProduct) -> None:
+    if not out.title and isinstance(product.get("name"), str):
+        out.title = clean_text(unescape(product["name"]))
+    offers = product.get("offers")
+    for offer in (offers if isinstance(offers, list) else [offers]):
+        if not isinstance(offer, dict):
+            continue
+        if out.price is None:
+            out.price = _parse_price_value(offer.get("price", offer.get("lowPrice")))
+            if out.price is None and isinstance(offer.get("priceSpecification"), dict):
+                out.price = _parse_price_value(offer["priceSpecification"].get("price"))
+        if not out.currency and isinstance(offer.get("priceCurrency"), str):
+            out.currency = clean_text(offer["priceCurrency"])
+        if not out.stock:
+            out.stock = _parse_availability(offer.get("availability"))
+
+
+def extract_structured(html: str) -> StructuredProduct:
+    """
+    Reads product fields from JSON-LD Product/Offer, itemprop attributes,
+    product: meta tags and the first <h1> using regex scans only.
+    Missing fields stay empty.
+    """
+    out = StructuredProduct()
+
+    for m in _JSONLD_RE.finditer(html):
+        try:
+            data = json.loads(m.group(1).strip(), strict=False)
+        except ValueError:
+            continue
+        for node in _iter_jsonld_nodes(data):
+            if _is_type(node, "Product"):
+                _apply_jsonld_product(node, out)
+
+    head_end = _HEAD_END_RE.search(html)
+    head = html[:head_end.start()] if head_end else html
+    meta: Dict[str, str] = {}
+    for tag in _META_TAG_RE.findall(head):
+        attrs = _tag_attrs(tag)
+        key = (attrs.get("property") or attrs.get("name") or "").lower()
+        if key and "content" in attrs:
+            meta.setdefault(key, attrs["content"])
+
+    if out.price is None or not out.currency or not out.stock:
+        for m in _ITEMPROP_TAG_RE.finditer(html):
+            prop = m.group(1).lower()
+            attrs = _tag_attrs(m.group(0))
+            value = attrs.get("content") or attrs.get("href") or ""
+            if prop == "price" and out.price is None:
+                out.price = _parse_price_value(value)
+            elif prop == "pricecurrency" and not out.currency:
+                out.currency = clean_text(value)
+            elif prop == "availability" and not out.stock:
+                out.stock = _parse_availability(value)
+
+    if out.price is None and meta.get("product:price:amount"):
+        out.price = _parse_price_value(meta["product:price:amount"])
+    if not out.currency and meta.get("product:price:currency"):
+        out.currency = clean_text(meta["product:price:currency"])
+    if not out.stock:
+        out.stock = _parse_availability(meta.get("product:availability") or meta.get("og:availability"))
+    if not out.title:
+        # Same preference as extract_title(): the first <h1> wins over og:title
+        h1 = _H1_RE.search(html)
+        if h1:
+            out.title = clean_text(unescape(_TAG_RE.sub(" ", h1.group(1))))
+    return out
+
+
+def extract_product(html: str, currency_override: str = "", fast_path: bool = True) -> Dict[str, object]:
+    """
+    Returns title, price, currency and stock for one product page.
+    Structured data is tried first; the page is only parsed with BeautifulSoup
+    for fields it does not provide.
+    """
+    fields = extract_structured(html) if fast_path else StructuredProduct()
+    page: Optional[PageContext] = None
+
+    def soup_page() -> PageContext:
+        nonlocal page
+        if page is None:
+            page = PageContext.from_html(html)
+        return page
+
+    title = fields.title or extract_title(soup_page())
+    price = fields.price if fields.price is not None else extract_price(soup_page())
+    currency = currency_override or fields.currency or extract_currency(soup_page())
+    if fields.stock:
+        stock, stock_match = fields.stock, "structured data"
+    else:
+        match = find_stock_match(soup_page())
+        stock = stock_status_from_match(match)
+        stock_match = match.describe() if match is not None else ""
+    return {"title": title, "price": price, "currency": currency, "stock": stock, "stock_match": stock_match}
 
 
 def guess_category_from_url(url: str) -> Tuple[str, str]:
@@ -248,15 +2261,693 @@ def guess_category_from_url(url: str) -> Tuple[str, str]:
     return cat, sub
 
 
+def build_product_row(url: str, fields: Dict[str, object]) -> Dict[str, object]:
+    cat, sub = guess_category_from_url(url)
+    return {
+        "category": cat,
+        "subcategory": sub,
+        "title": fields["title"],
+        "price": fields["price"],
+        "currency": fields["currency"],
+        "stock": fields["stock"],
+        "stock_match": fields.get("stock_match", ""),
+        "url": url,
+    }
+
+
+def build_error_row(url: str, meta: Dict[str, str], error: Exception) -> Dict[str, object]:
+    return {
+        "category": "",
+        "subcategory": "",
+        "title": "",
+        "price": None,
+        "currency": meta.get("currency_override") or "",
+        "stock": "",
+        "stock_match": "",
+        "url": url,
+        "error": str(error),
+    }
+
+
+def process_product_page(
+    url: str,
+    headers: dict,
+    meta: Dict[str, str],
+    in_stock_only: bool,
+    client: Optional[HttpClient] = None,
+    parse_pool: Optional[Executor] = None,
+    state: Optional[CrawlStateStore] = None,
+) -> Optional[Dict[str, object]]:
+    """
+    Fetches one product page and returns its catalog row.
+    Returns None when the product is skipped (out of stock with in_stock_only).
+    Errors never raise; they come back as a row with an 'error' field.
+    With parse_pool, extraction runs there (e.g. a ProcessPoolExecutor) instead of
+    on the fetching thread. With state, a 304 Not Modified reuses the stored row.
+    """
+    try:
+        if client is not None:
+            result = client.fetch(url)
+            previous = state.get_row(url) if state is not None and result.not_modified else None
+            if previous is not None:
+                if in_stock_only and previous.get("stock") == "out_of_stock":
+                    return None
+                return previous
+            html = result.text
+        else:
+            html = fetch_text(url, headers=headers)
+        currency_override = meta.get("currency_override") or ""
+        if parse_pool is not None:
+            fields = parse_pool.submit(extract_product, html, currency_override).result()
+        else:
+            fields = extract_product(html, currency_override=currency_override)
+
+        if in_stock_only and fields["stock"] == "out_of_stock":
+            return None
+        return build_product_row(url, fields)
+
+    except Exception as e:
+        return build_error_row(url, meta, e)
+
+
+async def aprocess_product_page(
+    url: str,
+    meta: Dict[str, str],
+    in_stock_only: bool,
+    client: AsyncHttpClient,
+    parse_pool: Optional[Executor] = None,
+) -> Optional[Dict[str, object]]:
+    """Async process_product_page(); extraction runs on parse_pool or the loop's default thread pool."""
+    try:
+        html = await client.fetch_text(url)
+        currency_override = meta.get("currency_override") or ""
+        fields = await asyncio.get_running_loop().run_in_executor(
+            parse_pool, extract_product, html, currency_override
+        )
+        if in_stock_only and fields["stock"] == "out_of_stock":
+            return None
+        return build_product_row(url, fields)
+
+    except Exception as e:
+        return build_error_row(url, meta, e)
+
+
+def iter_product_rows(
+    urls: Iterable[str],
+    headers: dict,
+    meta: Dict[str, str],
+    in_stock_only: bool,
+    workers: int = DEFAULT_WORKERS,
+    client: Optional[HttpClient] = None,
+    parse_pool: Optional[Executor] = None,
+    state: Optional[CrawlStateStore] = None,
+    async_client: Optional[AsyncHttpClient] = None,
+    pool: Optional[Executor] = None,
+) -> Iterator[Tuple[str, Optional[Dict[str, object]]]]:
+    """
+    Fetches product pages on a bounded thread pool (or the shared pool given), or on
+    async_client's event loop.
+    Yields (url, row) for every input URL, in input order (row is None for skipped products).
+    At most 2 * workers pages (async: 2 * max_in_flight) are in flight or buffered at any time.
+    """
+    workers = max(1, workers)
+    window = 2 * (async_client.max_in_flight if async_client is not None else workers)
+    own_pool = pool is None
+    if own_pool:
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+    pending = deque()
+    try:
+
+        def submit(url: str) -> Future:
+            if async_client is not None:
+                return async_client.submit(
+                    aprocess_product_page(url, meta, in_stock_only, async_client, parse_pool)
+                )
+            return pool.submit(
+                process_product_page, url, headers, meta, in_stock_only, client, parse_pool, state
+            )
+
+        for url in urls:
+            pending.append((url, submit(url)))
+            if len(pending) >= window:
+                url, fut = pending.popleft()
+                yield url, fut.result()
+        while pending:
+            url, fut = pending.popleft()
+            yield url, fut.result()
+    finally:
+        for _, fut in pending:
+            fut.cancel()
+        if own_pool:
+            pool.shutdown()
+
+
+class CheckpointJournal:
+    """
+    Append-only SQLite journal of finished product URLs and their rows.
+
+    Rerunning with the same journal skips URLs that already finished (skipped
+    out-of-stock products included); pages that ended in an error are retried.
+    The final export is rebuilt from the journal, in completion order.
+    """
+
+    def __init__(self, path: str, commit_every: int = 200, commit_interval_s: float = 2.0):
+        self.path = path
+        self.commit_every = max(1, commit_every)
+        self.commit_interval_s = commit_interval_s
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self._committed_at = time.monotonic()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " url TEXT NOT NULL UNIQUE,"
+            " row TEXT,"
+            " error INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM pages WHERE error = 0").fetchone()[0]
+
+    def is_done(self, url: str) -> bool:
+        with self._lock:
+            hit = self._db.execute("SELECT 1 FROM pages WHERE url = ? AND error = 0", (url,)).fetchone()
+        return hit is not None
+
+    def record(self, url: str, row: Optional[Dict[str, object]]) -> None:
+        """Stores a finished URL; row is None for products skipped by the stock filter."""
+        data = json.dumps(row, ensure_ascii=False) if row is not None else None
+        failed = 1 if row is not None and "error" in row else 0
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, row, error) VALUES (?, ?, ?)",
+                (url, data, failed),
+            )
+            self._uncommitted += 1
+            # Commit in batches, but never sit on records for long: a killed run loses at most a few seconds
+            now = time.monotonic()
+            if self._uncommitted >= self.commit_every or now - self._committed_at >= self.commit_interval_s:
+                self._db.commit()
+                self._uncommitted = 0
+                self._committed_at = now
+
+    def iter_rows(self) -> Iterator[Dict[str, object]]:
+        with self._lock:
+            self._db.commit()
+            cur = self._db.execute("SELECT row FROM pages WHERE row IS NOT NULL ORDER BY seq")
+            batch = cur.fetchmany(1000)
+        while batch:
+            for (data,) in batch:
+                yield json.loads(data)
+            with self._lock:
+                batch = cur.fetchmany(1000)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+
+class WorkQueue:
+    """
+    SQLite work queue of product URLs for the distributed (--queue) mode.
+
+    The coordinator enqueues filtered URLs; workers in other processes or on other
+    machines (sharing the file) lease a batch, fetch and extract it, and store the
+    rows back. Workers renew their leases while they work; a lease that is not renewed
+    or completed within lease_s - e.g. because its worker died - is issued again, and
+    after max_attempts the URL is closed with an error row. Error rows are re-queued
+    until max_attempts is reached as well, and a good row still replaces them later.
+    Each coordinator run is numbered: only the URLs it enqueued are leased and exported.
+    """
+
+    PENDING, LEASED, DONE = 0, 1, 2
+
+    def __init__(self, path: str, lease_s: float = 300.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_s = max(1.0, lease_s)
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        # Autocommit; every write runs in an explicit BEGIN IMMEDIATE so processes serialize cleanly
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " url TEXT NOT NULL UNIQUE,"
+                " status INTEGER NOT NULL DEFAULT 0,"
+                " lease_until REAL NOT NULL DEFAULT 0,"
+                " worker TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " row TEXT,"
+                " failed INTEGER NOT NULL DEFAULT 0,"
+                " run INTEGER NOT NULL DEFAULT 0,"
+                " lastmod TEXT NOT NULL DEFAULT '')"
+            )
+            columns = {info[1] for info in db.execute("PRAGMA table_info(tasks)")}
+            for column, kind in (("failed", "INTEGER NOT NULL DEFAULT 0"), ("run", "INTEGER NOT NULL DEFAULT 0"),
+                                 ("lastmod", "TEXT NOT NULL DEFAULT ''")):  # queue files from before these columns
+                if column not in columns:
+                    db.execute(f"ALTER TABLE tasks ADD COLUMN {column} {kind}")
+            db.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, seq)")
+            db.execute("CREATE INDEX IF NOT EXISTS tasks_run ON tasks (run, status, seq)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @staticmethod
+    def _meta(db, key: str, default: str = "") -> str:
+        hit = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return hit[0] if hit is not None else default
+
+    def get_meta(self, key: str, default: str = "") -> str:
+        with self._lock:
+            return self._meta(self._db, key, default)
+
+    def _run(self, db) -> int:
+        return int(self._meta(db, "run", "0"))
+
+    def start_run(self) -> int:
+        """Starts a coordinator run; returns its number for enqueue()."""
+        with self._transaction() as db:
+            run = self._run(db) + 1
+            db.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [("run", str(run)), ("crawl_done", "0")]
+            )
+        return run
+
+    def enqueue(self, entries: Iterable[Tuple[str, str]], run: int, chunk: int = 1000) -> int:
+        """
+        Adds (url, lastmod) entries to run; a URL queued before keeps its state (a
+        finished row is reused) and moves to run. Returns how many URLs were read.
+        """
+        count = 0
+        batch: List[Tuple[str, int, str]] = []
+        for url, lastmod in entries:
+            batch.append((url, run, lastmod))
+            if len(batch) >= chunk:
+                count += len(batch)
+                self._insert(batch)
+                batch = []
+        if batch:
+            count += len(batch)
+            self._insert(batch)
+        return count
+
+    def _insert(self, batch: List[Tuple[str, int, str]]) -> None:
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT INTO tasks (url, run, lastmod) VALUES (?, ?, ?)"
+                " ON CONFLICT (url) DO UPDATE SET run = excluded.run, lastmod = excluded.lastmod",
+                batch,
+            )
+
+    def _reap(self, db, now: float) -> None:
+        # Expired leases that used up their attempts are closed with an error row
+        expired = db.execute(
+            "SELECT seq, url FROM tasks WHERE status = ? AND lease_until < ? AND attempts >= ?",
+            (self.LEASED, now, self.max_attempts),
+        ).fetchall()
+        if not expired:
+            return
+        meta = {"currency_override": self._meta(db, "currency_override")}
+        error = RuntimeError(f"lease expired {self.max_attempts} times")
+        db.executemany(
+            "UPDATE tasks SET status = ?, row = ?, failed = 1, lease_until = 0 WHERE seq = ?",
+            [(self.DONE, json.dumps(build_error_row(url, meta, error), ensure_ascii=False), seq) for seq, url in expired],
+        )
+
+    def reap(self) -> None:
+        with self._transaction() as db:
+            self._reap(db, time.time())
+
+    def lease(self, worker: str, n: int) -> List[str]:
+        """Leases up to n URLs of the current run (pending ones, or ones whose lease expired) to worker."""
+        now = time.time()
+        with self._transaction() as db:
+            self._reap(db, now)
+            rows = db.execute(
+                "SELECT seq, url FROM tasks WHERE run = ? AND (status = ? OR (status = ? AND lease_until < ?))"
+                " ORDER BY seq LIMIT ?",
+                (self._run(db), self.PENDING, self.LEASED, now, max(1, n)),
+            ).fetchall()
+            db.executemany(
+                "UPDATE tasks SET status = ?, lease_until = ?, worker = ?, attempts = attempts + 1 WHERE seq = ?",
+                [(self.LEASED, now + self.lease_s, worker, seq) for seq, _ in rows],
+            )
+        return [url for _, url in rows]
+
+    def renew(self, worker: str) -> None:
+        """Extends the leases worker still holds, so slow pages are not issued twice."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE tasks SET lease_until = ? WHERE status = ? AND worker = ?",
+                (time.time() + self.lease_s, self.LEASED, worker),
+            )
+
+    def complete(self, results: Iterable[Tuple[str, Dict[str, object]]]) -> None:
+        """
+        Stores finished rows; error rows go back to the queue while attempts remain.
+        A good row also replaces an error row stored earlier (e.g. after a lease expired).
+        """
+        with self._transaction() as db:
+            for url, row in results:
+                data = json.dumps(row, ensure_ascii=False)
+                if "error" in row:
+                    db.execute(
+                        "UPDATE tasks SET status = CASE WHEN attempts < ? THEN ? ELSE ? END,"
+                        " row = ?, failed = 1, lease_until = 0 WHERE url = ? AND status != ?",
+                        (self.max_attempts, self.PENDING, self.DONE, data, url, self.DONE),
+                    )
+                else:
+                    db.execute(
+                        "UPDATE tasks SET status = ?, row = ?, failed = 0, lease_until = 0"
+                        " WHERE url = ? AND (status != ? OR failed = 1)",
+                        (self.DONE, data, url, self.DONE),
+                    )
+
+    def release(self, worker: str) -> None:
+        """Returns a stopping worker's unfinished leases to the queue."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE tasks SET status = ?, lease_until = 0, attempts = MAX(0, attempts - 1)"
+                " WHERE status = ? AND worker = ?",
+                (self.PENDING, self.LEASED, worker),
+            )
+
+    def counts(self) -> Dict[str, int]:
+        """URLs of the current run per state."""
+        names = {self.PENDING: "pending", self.LEASED: "leased", self.DONE: "done"}
+        out = dict.fromkeys(names.values(), 0)
+        with self._lock:
+            run = self._run(self._db)
+            for status, n in self._db.execute("SELECT status, COUNT(*) FROM tasks WHERE run = ? GROUP BY status", (run,)):
+                out[names[status]] = n
+        return out
+
+    def finished(self) -> bool:
+        """True once the coordinator has enqueued everything and no URL is left open."""
+        if self.get_meta("crawl_done") != "1":
+            return False
+        counts = self.counts()
+        return counts["pending"] + counts["leased"] == 0
+
+    def iter_results(self) -> Iterator[Tuple[str, Dict[str, object], str]]:
+        """Yields (url, row, lastmod) for the current run's finished URLs in enqueue order."""
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT url, row, lastmod FROM tasks WHERE run = ? AND status = ? ORDER BY seq",
+                (self._run(self._db), self.DONE),
+            )
+            batch = cur.fetchmany(1000)
+        while batch:
+            for url, data, lastmod in batch:
+                yield url, json.loads(data), lastmod
+            with self._lock:
+                batch = cur.fetchmany(1000)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def iter_queue_rows(
+    queue: WorkQueue,
+    entries: Iterable[Tuple[str, str]],
+    meta: Dict[str, str],
+    poll_s: float = 2.0,
+    progress: bool = True,
+) -> Iterator[Tuple[str, Dict[str, object], str]]:
+    """
+    Coordinator side of --queue: enqueues (url, lastmod) entries for queue workers,
+    waits until every URL is finished, then yields (url, row, lastmod) in enqueue
+    order for the merged export.
+    """
+    run = queue.start_run()
+    queue.set_meta("currency_override", meta.get("currency_override") or "")
+    queue.enqueue(entries, run)
+    queue.set_meta("crawl_done", "1")
+    with tqdm(total=sum(queue.counts().values()), desc="Waiting for queue workers", unit="page",
+              disable=not progress) as pbar:
+        while True:
+            queue.reap()
+            counts = queue.counts()
+            pbar.n = counts["done"]
+            pbar.refresh()
+            if counts["pending"] + counts["leased"] == 0:
+                break
+            time.sleep(poll_s)
+    yield from queue.iter_results()
+
+
+class RowWriter:
+    """
+    Base class for catalog output writers. Rows are written one at a time as
+    they are extracted; subclasses must not buffer the whole catalog.
+    """
+
+    extension = ""
+
+    def __init__(self, path: str, columns: List[str] = CATALOG_COLUMNS):
+        self.path = path
+        self.columns = list(columns)
+        self.rows_written = 0
+
+    def write(self, row: Dict[str, object]) -> None:
+        self._write(row)
+        self.rows_written += 1
+
+    def _write(self, row: Dict[str, object]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "RowWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ExcelRowWriter(RowWriter):
+    """
+    Streaming xlsx writer (openpyxl write-only mode).
+    Rows are appended as they arrive, so memory stays constant for any catalog size.
+    """
+
+    extension = "xlsx"
+
+    def __init__(self, path: str, columns: List[str] = CATALOG_COLUMNS, sheet_name: str = "catalog"):
+        super().__init__(path, columns)
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet(title=sheet_name)
+        self._ws.append(self.columns)
+
+    def _write(self, row: Dict[str, object]) -> None:
+        self._ws.append([row.get(c) for c in self.columns])
+
+    def close(self) -> None:
+        if self._wb is not None:
+            self._wb.save(self.path)
+            self._wb = None
+
+
+class CsvRowWriter(RowWriter):
+    extension = "csv"
+
+    def __init__(self, path: str, columns: List[str] = CATALOG_COLUMNS):
+        super().__init__(path, columns)
+        self._fh = open(path, "w", newline="", encoding="utf-8")
+        self._csv = csv.DictWriter(self._fh, fieldnames=self.columns, extrasaction="ignore")
+        self._csv.writeheader()
+
+    def _write(self, row: Dict[str, object]) -> None:
+        self._csv.writerow(row)
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class NdjsonRowWriter(RowWriter):
+    """One JSON object per line; every object has all columns (missing = null)."""
+
+    extension = "ndjson"
+
+    def __init__(self, path: str, columns: List[str] = CATALOG_COLUMNS):
+        super().__init__(path, columns)
+        self._fh = open(path, "w", encoding="utf-8")
+
+    def _write(self, row: Dict[str, object]) -> None:
+        self._fh.write(json.dumps({c: row.get(c) for c in self.columns}, ensure_ascii=False))
+        self._fh.write("\n")
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class ParquetRowWriter(RowWriter):
+    """
+    Parquet writer (pip install pyarrow). Rows are buffered only up to
+    row_group_size and then flushed as one row group.
+    """
+
+    extension = "parquet"
+
+    def __init__(self, path: str, columns: List[str] = CATALOG_COLUMNS, row_group_size: int = 10_000):
+        if pa is None:
+            raise RuntimeError("Parquet output requires pyarrow: pip install pyarrow")
+        super().__init__(path, columns)
+        self.row_group_size = row_group_size
+        self._schema = pa.schema([
+            (c, pa.float64() if c == "price" else pa.string()) for c in self.columns
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._buffer: List[Dict[str, object]] = []
+
+    def _write(self, row: Dict[str, object]) -> None:
+        self._buffer.append(row)
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        table = pa.Table.from_pydict(
+            {c: [r.get(c) for r in self._buffer] for c in self.columns},
+            schema=self._schema,
+        )
+        self._writer.write_table(table)
+        self._buffer = []
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+            self._writer = None
+
+
+OUTPUT_WRITERS = {
+    "xlsx": ExcelRowWriter,
+    "csv": CsvRowWriter,
+    "ndjson": NdjsonRowWriter,
+    "parquet": ParquetRowWriter,
+}
+
+
+def open_row_writer(path: str, fmt: str = "") -> RowWriter:
+    """Opens a writer for fmt, or for the path's extension when fmt is empty."""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".") or "xlsx").lower()
+    if fmt == "jsonl":
+        fmt = "ndjson"
+    if fmt not in OUTPUT_WRITERS:
+        raise ValueError(f"Unsupported output format: {fmt} (choose from {', '.join(OUTPUT_WRITERS)})")
+    return OUTPUT_WRITERS[fmt](path)
+
+
+class CrawlStateStore:
+    """
+    SQLite store of product rows from earlier runs, keyed by URL together with the
+    sitemap <lastmod> they were fetched under. A page whose lastmod is unchanged
+    reuses its stored row instead of being fetched again.
+    """
+
+    def __init__(self, path: str, commit_every: int = 200, commit_interval_s: float = 2.0):
+        self.path = path
+        self.commit_every = max(1, commit_every)
+        self.commit_interval_s = commit_interval_s
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self._committed_at = time.monotonic()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " lastmod TEXT NOT NULL DEFAULT '',"
+            " row TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, url: str, lastmod: str) -> Optional[Dict[str, object]]:
+        """Stored row for url if it was fetched under the same (non-empty) lastmod."""
+        if not lastmod:
+            return None
+        with self._lock:
+            hit = self._db.execute(
+                "SELECT row FROM pages WHERE url = ? AND lastmod = ?", (url, lastmod)
+            ).fetchone()
+        return json.loads(hit[0]) if hit else None
+
+    def get_row(self, url: str) -> Optional[Dict[str, object]]:
+        """Stored row for url regardless of lastmod (e.g. after a 304 Not Modified)."""
+        with self._lock:
+            hit = self._db.execute("SELECT row FROM pages WHERE url = ?", (url,)).fetchone()
+        return json.loads(hit[0]) if hit else None
+
+    def put(self, url: str, lastmod: str, row: Dict[str, object]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, lastmod, row, fetched_at) VALUES (?, ?, ?, ?)",
+                (url, lastmod or "", json.dumps(row, ensure_ascii=False), time.time()),
+            )
+            self._uncommitted += 1
+            now = time.monotonic()
+            if self._uncommitted >= self.commit_every or now - self._committed_at >= self.commit_interval_s:
+                self._db.commit()
+                self._uncommitted = 0
+                self._committed_at = now
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+
+def parse_process_count(value: str) -> int:
+    """CLI value for --processes: 'auto' means one per CPU core, 0 disables the pool."""
+    if value.strip().lower() == "auto":
+        return os.cpu_count() or 1
+    n = int(value)
+    if n < 0:
+        raise argparse.ArgumentTypeError("must be 'auto' or >= 0")
+    return n
+
+
 def interactive_prompt() -> Tuple[str, FilterConfig, Dict[str, str], bool, float, int]:
     print("\n=== Universal Sitemap Catalog Exporter ===\n")
 
     print("How to find a sitemap URL:")
-    print("  1) Try: https://example.com/sitemap.xml")
-    print("  2) Or check: https://example.com/robots.txt (look for 'Sitemap: ...')")
+    print("  1) Enter just the shop URL (https://shop.com): sitemaps are read from its robots.txt")
+    print("  2) Or try: https://example.com/sitemap.xml")
     print("  3) Some sites use an index: sitemap_index.xml\n")
 
-    sitemap_url = input("Enter sitemap URL (e.g. https://shop.com/sitemap.xml): ").strip()
+    sitemap_url = input("Enter sitemap or shop URL (e.g. https://shop.com/sitemap.xml or https://shop.com): ").strip()
     if not sitemap_url:
         raise SystemExit("No sitemap URL provided.")
 
@@ -274,7 +2965,7 @@ def interactive_prompt() -> Tuple[str, FilterConfig, Dict[str, str], bool, float
     out_only = input("Keep ONLY in-stock products? (y/n, default y): ").strip().lower()
     in_stock_only = (out_only != "n")
 
-    delay = input("Polite delay between product page requests in seconds (default 0.2): ").strip()
+    delay = input("Polite delay between requests in seconds, if robots.txt sets no Crawl-delay (default 0.2; 0 = no limit): ").strip()
     polite_delay = float(delay) if delay else 0.2
 
     limit = input("Optional limit for number of product pages to fetch (Enter for no limit): ").strip()
@@ -294,98 +2985,647 @@ def interactive_prompt() -> Tuple[str, FilterConfig, Dict[str, str], bool, float
     return sitemap_url, fc, meta, in_stock_only, polite_delay, max_products
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Universal sitemap to Excel catalog exporter.")
-    parser.add_argument("--non-interactive", action="store_true", help="Use CLI args instead of prompts (advanced).")
-    args = parser.parse_args()
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Universal sitemap to Excel/CSV/NDJSON/Parquet catalog exporter.")
+    parser.add_argument("--config", default="",
+                        help="JSON file with option values (keys are option names, e.g. \"sitemap_url\"); "
+                             "command-line flags override it.")
+    parser.add_argument("--non-interactive", action="store_true",
+                        help="Take every setting from flags/config instead of prompts (implied by --sitemap-url).")
+
+    run = parser.add_argument_group("run settings (same as the interactive prompts)")
+    run.add_argument("--sitemap-url", default="",
+                     help="Sitemap or sitemap index URL, or a site URL to find the sitemaps in robots.txt.")
+    run.add_argument("--product-marker", default="", help="Only URLs containing this marker, e.g. /product/.")
+    run.add_argument("--include", default="", help="Comma-separated keywords; URL must contain ANY of them.")
+    run.add_argument("--must-contain-any", default="", help="Comma-separated keywords; URL must contain ANY of them.")
+    run.add_argument("--exclude", default="", help="Comma-separated keywords; URLs containing any are skipped.")
+    run.add_argument("--include-out-of-stock", action="store_true", help="Keep out-of-stock products too.")
+    run.add_argument("--delay", type=float, default=0.2,
+                     help="Polite delay between requests to a shop in seconds (default 0.2; 0 = no limit).")
+    run.add_argument("--limit", type=int, default=0, help="Max product pages to fetch (default 0 = no limit).")
+    run.add_argument("--currency", default="", help="Force this currency code in the output, e.g. EUR.")
+    run.add_argument("--stock-phrases", default="",
+                     help="JSON file with extra stock phrase packs per locale (see README).")
+    run.add_argument("--locale", default="",
+                     help="Comma-separated phrase packs to use for stock detection, e.g. nl,en (default: all).")
+    run.add_argument("--ignore-robots", action="store_true",
+                     help="Do not apply robots.txt Disallow rules and Crawl-delay (Sitemap: lines are still used).")
+
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument("--batch", default="",
+                       help="JSON manifest of shops to export in one process (see README); "
+                            "other flags act as defaults for every shop.")
+    batch.add_argument("--batch-concurrency", type=int, default=8, help="Shops exported at the same time (default 8).")
+    batch.add_argument("--output-dir", default="", help="Directory for batch outputs without an explicit \"output\".")
+
+    dist = parser.add_argument_group("distributed mode")
+    dist.add_argument("--queue", default="",
+                      help="SQLite work queue file. On its own this run crawls the sitemap, queues the product URLs, "
+                           "waits for workers and writes the merged export.")
+    dist.add_argument("--queue-worker", action="store_true",
+                      help="Run as a worker: lease URLs from --queue, fetch and extract them, store the rows back.")
+    dist.add_argument("--lease-seconds", type=float, default=300.0,
+                      help="Seconds a worker may hold leased URLs before they are issued again (default 300).")
+
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrent product page fetches (default {DEFAULT_WORKERS}).")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Max requests/second per host (default: 1 / polite delay; 0 = unlimited).")
+    parser.add_argument("--burst", type=int, default=1, help="Requests a host may receive back-to-back (default 1).")
+    parser.add_argument("--no-adaptive-rate", action="store_true",
+                        help="Do not slow down on 429/503 responses (Retry-After is still honored).")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="Keep-alive connections per host (default: same as --workers).")
+    parser.add_argument("--http2", action="store_true", help='Use HTTP/2 (requires: pip install "httpx[http2]").')
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Fetch with asyncio on a single thread (requires: pip install httpx).")
+    parser.add_argument("--max-in-flight", type=int, default=200,
+                        help="Async mode: max concurrent requests overall (default 200).")
+    parser.add_argument("--per-host", type=int, default=16,
+                        help="Async mode: max concurrent requests per host (default 16).")
+    parser.add_argument("--processes", type=parse_process_count, default=0,
+                        help="Parse pages in N worker processes ('auto' = one per CPU core; default 0 = in-thread).")
+    parser.add_argument("--format", choices=sorted(OUTPUT_WRITERS), default="",
+                        help="Output format (default: from --output extension, else xlsx).")
+    parser.add_argument("--output", default="", help="Output file (default: <domain>_catalog.<format>).")
+    parser.add_argument("--state", default="",
+                        help="SQLite state from earlier runs; pages with an unchanged sitemap <lastmod> are not refetched.")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Retries per request on connection errors, timeouts, 429 and 5xx (default 2).")
+    parser.add_argument("--retry-budget", type=float, default=0.2,
+                        help="Max retries as a fraction of all requests (default 0.2).")
+    parser.add_argument("--breaker-threshold", type=int, default=10,
+                        help="Pause a host after this many consecutive failures (default 10; 0 = never).")
+    parser.add_argument("--breaker-cooldown", type=float, default=60.0,
+                        help="Seconds a failing host stays paused (default 60).")
+    parser.add_argument("--cache-dir", default="",
+                        help="On-disk HTTP cache; requests become conditional (ETag / Last-Modified).")
+    parser.add_argument("--cache-size-mb", type=int, default=1024, help="HTTP cache size limit (default 1024 MB).")
+    parser.add_argument("--dedupe-db", default="",
+                        help="De-duplicate sitemap URLs with a Bloom filter backed by this SQLite file "
+                             "(for very large sitemap trees; default: in-memory fingerprints).")
+    parser.add_argument("--journal", default="",
+                        help="SQLite checkpoint journal; rerun with the same file to resume an interrupted run.")
+    return parser
+
+
+def load_config_file(path: str, parser: argparse.ArgumentParser) -> Dict[str, object]:
+    """Reads a JSON config whose keys are option names ("sitemap-url" or "sitemap_url")."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            raw = json.load(fh)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Cannot read config file {path}: {e}")
+    if not isinstance(raw, dict):
+        raise SystemExit(f"Config file {path} must contain a JSON object.")
+    known = {a.dest for a in parser._actions}
+    aliases = {"async": "use_async"}
+    config: Dict[str, object] = {}
+    for key, value in raw.items():
+        dest = key.replace("-", "_")
+        dest = aliases.get(dest, dest)
+        if dest not in known or dest in ("help", "config"):
+            raise SystemExit(f"Unknown option in config file {path}: {key}")
+        config[dest] = value
+    return config
+
+
+def parse_args(argv: Optional[List[str]] = None, parser: Optional[argparse.ArgumentParser] = None) -> argparse.Namespace:
+    parser = parser or build_arg_parser()
+    pre, _ = parser.parse_known_args(argv)
+    if pre.config:
+        parser.set_defaults(**load_config_file(pre.config, parser))
+    return parser.parse_args(argv)
+
+
+def split_keywords(value) -> List[str]:
+    """Comma-separated string (CLI) or list (config file) -> list of keywords."""
+    items = value if isinstance(value, (list, tuple)) else str(value or "").split(",")
+    return [str(x).strip() for x in items if str(x).strip()]
+
+
+def settings_from_args(args: argparse.Namespace) -> Tuple[str, FilterConfig, Dict[str, str], bool, float, int]:
+    """Non-interactive counterpart of interactive_prompt()."""
+    if not args.sitemap_url:
+        raise SystemExit("No sitemap URL provided (use --sitemap-url or \"sitemap_url\" in --config).")
+    fc = FilterConfig(
+        product_marker=(args.product_marker or "").strip(),
+        include_keywords=split_keywords(args.include),
+        exclude_keywords=split_keywords(args.exclude),
+        must_contain_any=split_keywords(args.must_contain_any),
+    )
+    meta = {"currency_override": (args.currency or "").strip().upper()}
+    return args.sitemap_url.strip(), fc, meta, not args.include_out_of_stock, float(args.delay), int(args.limit or 0)
 
-    headers = dict(DEFAULT_HEADERS)
 
-    if args.non_interactive:
-        raise SystemExit("Non-interactive mode not implemented in this snippet. Use interactive mode.")
+def _terminate(signum, frame) -> None:
+    # SIGTERM (kill, timeout, container stop) unwinds like Ctrl+C, so open journals and stores are committed
+    raise SystemExit(128 + signum)
 
-    sitemap_url, fc, meta, in_stock_only, polite_delay, max_products = interactive_prompt()
 
-    print("\nFetching sitemap tree (this can take a moment)…")
-    all_urls = crawl_sitemap_tree(
-        sitemap_url=sitemap_url,
-        headers=headers,
-        polite_delay_s=0.0,
-    )
-    print(f"Total URLs in sitemap(s): {len(all_urls)}")
+def main(argv: Optional[List[str]] = None):
+    parser = build_arg_parser()
+    args = parse_args(argv, parser)
+    signal.signal(signal.SIGTERM, _terminate)
+    if args.stock_phrases or args.locale:
+        packs = load_stock_phrase_packs(args.stock_phrases) if args.stock_phrases else STOCK_PHRASE_PACKS
+        configure_stock_phrases(packs, split_keywords(args.locale))
 
-    # Filter to product URLs
-    filtered = [u for u in all_urls if url_passes_filters(u, fc)]
-    print(f"URLs after filters: {len(filtered)}")
+    if args.queue_worker:
+        if not args.queue:
+            raise SystemExit("--queue-worker needs --queue PATH.")
+        run_queue_worker(args)
+        return
 
-    if not filtered:
-        print("\nNo URLs matched your filters.")
-        print("Try relaxing filters (remove include keywords, remove product marker, etc.).")
+    if args.batch:
+        run_batch(args, load_batch_manifest(args.batch, parser))
         return
 
-    if max_products and len(filtered) > max_products:
-        filtered = filtered[:max_products]
-        print(f"Truncated to first {max_products} URLs due to limit.")
+    if args.non_interactive or args.sitemap_url:
+        settings = settings_from_args(args)
+    else:
+        settings = interactive_prompt()
 
-    rows = []
-    errors = 0
+    run_export(args, *settings)
 
-    for url in tqdm(filtered, desc="Fetching product pages", unit="page"):
-        try:
-            html = fetch_text(url, headers=headers)
-            soup = BeautifulSoup(html, "lxml")
 
-            title = extract_title(soup)
-            price = extract_price(soup)
-            currency = meta.get("currency_override") or extract_currency(soup)
-            stock = extract_stock_status(soup)
+@dataclass
+class ExportResources:
+    """HTTP clients and pools an export runs on; shared by all shops in --batch mode."""
+    headers: dict
+    limiter: HostRateLimiter
+    client: HttpClient
+    async_client: Optional[AsyncHttpClient] = None
+    parse_pool: Optional[Executor] = None
+    fetch_pool: Optional[FairExecutor] = None
+
+    def close(self, wait: bool = True) -> None:
+        """Closes everything; with wait=False queued work is dropped and running work is not awaited."""
+        if self.fetch_pool is not None:
+            self.fetch_pool.shutdown(wait=wait, cancel_futures=not wait)
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=wait, cancel_futures=not wait)
+        self.client.close()
+        if self.async_client is not None:
+            self.async_client.close()
+
+
+def export_rate(args: argparse.Namespace, polite_delay: float) -> float:
+    """Requests/second per host: --rate if given, else one request per polite delay."""
+    if args.rate is not None:
+        return args.rate
+    return 1.0 / polite_delay if polite_delay > 0 else 0.0
+
+
+def open_export_resources(args: argparse.Namespace, rate: float) -> ExportResources:
+    headers = dict(DEFAULT_HEADERS)
+    limiter = HostRateLimiter(rate=rate, burst=args.burst, adaptive=not args.no_adaptive_rate)
+    retry = RetryPolicy(retries=args.retries, budget_ratio=args.retry_budget) if args.retries > 0 else None
+    breaker = (CircuitBreaker(threshold=args.breaker_threshold, cooldown_s=args.breaker_cooldown)
+               if args.breaker_threshold > 0 else None)
+    try:
+        client = HttpClient(
+            headers,
+            pool_size=args.pool_size or args.workers,
+            limiter=limiter,
+            http2=args.http2,
+            cache=HttpCache(args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024) if args.cache_dir else None,
+            retry=retry,
+            breaker=breaker,
+        )
+        async_client = None
+        if args.use_async:
+            async_client = AsyncHttpClient(
+                headers,
+                max_in_flight=args.max_in_flight,
+                per_host=args.per_host,
+                limiter=limiter,
+                http2=args.http2,
+                retry=retry,
+                breaker=breaker,
+            )
+            if args.cache_dir:
+                print("[WARN] --cache-dir is not used in --async mode.", file=sys.stderr)
+    except (RuntimeError, ImportError) as e:
+        raise SystemExit(str(e))
+
+    parse_pool = None
+    if args.processes:
+        # Worker processes rebuild the stock phrase matcher chosen on the command line
+        parse_pool = ProcessPoolExecutor(
+            max_workers=args.processes, initializer=configure_stock_phrases, initargs=_stock_phrases
+        )
+    return ExportResources(headers, limiter, client, async_client, parse_pool)
+
+
+def run_export(
+    args: argparse.Namespace,
+    sitemap_url: str,
+    fc: FilterConfig,
+    meta: Dict[str, str],
+    in_stock_only: bool,
+    polite_delay: float,
+    max_products: int,
+    resources: Optional[ExportResources] = None,
+    verbose: bool = True,
+) -> Dict[str, object]:
+    """
+    Runs one sitemap-to-catalog export with the options in args and returns its summary.
+    With resources (batch mode), runs on those shared clients/pools and applies this
+    shop's rate to the hosts it visits; otherwise opens and closes its own.
+    """
+    log = print if verbose else (lambda *a, **k: None)
+    sitemap_url = normalize_site_url(sitemap_url)
+    rate = export_rate(args, polite_delay)
+    own_resources = resources is None
+    if own_resources:
+        resources = open_export_resources(args, rate)
+    headers, client, async_client = resources.headers, resources.client, resources.async_client
+    lane = resources.fetch_pool.lane(sitemap_url) if resources.fetch_pool is not None else None
+    robots = RobotsCache(client) if not args.ignore_robots else None
+    rated_hosts: Set[str] = set()
+
+    def rate_host(url: str) -> None:
+        # Each host gets this export's rate, or its robots.txt Crawl-delay
+        host = urlparse(url).netloc
+        if host in rated_hosts:
+            return
+        rated_hosts.add(host)
+        host_rate = robots.crawl_rate(url, rate, explicit=args.rate is not None) if robots is not None else rate
+        resources.limiter.set_rate(url, host_rate)
+
+    sitemap_urls = resolve_sitemap_urls(sitemap_url, robots or RobotsCache(client))
+    if sitemap_urls != [sitemap_url]:
+        log("Sitemaps: " + ", ".join(sitemap_urls))
+    for sm in sitemap_urls:
+        rate_host(sm)
+
+    stats = {"sitemap_urls": 0, "filtered": 0, "robots_blocked": 0, "resumed": 0, "unchanged": 0}
+    failed_sitemaps: List[str] = []
+    journal = CheckpointJournal(args.journal) if args.journal else None
+    if journal is not None and len(journal):
+        log(f"Resuming: {len(journal)} URLs already done in journal {args.journal}")
+    state = CrawlStateStore(args.state) if args.state else None
+    queue = WorkQueue(args.queue, lease_s=args.lease_seconds) if args.queue else None
+    deduper = UrlDeduper(args.dedupe_db)
+    sitemap_pages = iter_sitemap_pages(
+        sitemap_url=sitemap_urls,
+        headers=headers,
+        polite_delay_s=0.0,
+        client=client,
+        workers=args.per_host if async_client is not None else args.workers,
+        deduper=deduper,
+        async_client=async_client,
+        progress=verbose,
+        failed=failed_sitemaps,
+    )
 
-            if in_stock_only and stock == "out_of_stock":
-                time.sleep(polite_delay)
+    url_filter = compile_url_filter(fc)
+
+    def keep(row: Dict[str, object]) -> bool:
+        return not (in_stock_only and row.get("stock") == "out_of_stock")
+
+    def emit(url: str, row: Dict[str, object]) -> None:
+        nonlocal errors
+        if journal is not None:
+            journal.record(url, row)
+        elif keep(row):
+            if "error" in row:
+                errors += 1
+            writer.write(row)
+
+    def product_entries() -> Iterator[Tuple[str, str]]:
+        # Filter to (url, lastmod) of product pages while the sitemap tree is still being read
+        for entry in sitemap_pages:
+            u = entry.loc
+            stats["sitemap_urls"] += 1
+            if not url_filter.matches(u):
                 continue
+            if robots is not None and not robots.allowed(u):
+                stats["robots_blocked"] += 1
+                continue
+            stats["filtered"] += 1
+            cached = state.get(u, entry.lastmod) if state is not None else None
+            if journal is not None and journal.is_done(u):
+                stats["resumed"] += 1
+            elif cached is not None:
+                stats["unchanged"] += 1
+                emit(u, cached)
+            else:
+                rate_host(u)
+                yield u, entry.lastmod
+            if max_products and stats["filtered"] >= max_products:
+                log(f"\nStopped after first {max_products} URLs due to limit.")
+                return
 
-            cat, sub = guess_category_from_url(url)
-
-            rows.append({
-                "category": cat,
-                "subcategory": sub,
-                "title": title,
-                "price": price,
-                "currency": currency,
-                "stock": stock,
-                "url": url,
-            })
+    errors = 0
 
-            time.sleep(polite_delay)
+    # Make output filename from domain
+    out_file = args.output or default_output_path(sitemap_url, args.format)
+    try:
+        writer = open_row_writer(out_file, args.format)
+    except (RuntimeError, ValueError) as e:
+        if own_resources:
+            resources.close()
+        deduper.close()
+        for store in (journal, state, queue):
+            if store is not None:
+                store.close()
+        raise SystemExit(str(e))
+
+    def fetched_rows() -> Iterator[Tuple[str, Dict[str, object], str]]:
+        # Only pages in flight wait in lastmods; queue mode keeps the lastmod in the queue file
+        lastmods: Dict[str, str] = {}
+
+        def product_urls() -> Iterator[str]:
+            for u, lastmod in product_entries():
+                if state is not None:
+                    lastmods[u] = lastmod
+                yield u
+
+        rows = iter_product_rows(
+            product_urls(),
+            headers=headers,
+            meta=meta,
+            in_stock_only=False,
+            workers=args.workers,
+            client=client,
+            parse_pool=resources.parse_pool,
+            state=state,
+            async_client=async_client,
+            pool=lane,
+        )
+        try:
+            for url, row in rows:
+                yield url, row, lastmods.pop(url, "")
+        finally:
+            rows.close()
+
+    log("\nReading sitemap tree and fetching product pages…")
+    # Stock filtering happens in keep(), so the journal and state keep every product
+    if queue is not None:
+        log(f"Product pages are fetched by queue workers: --queue {args.queue} --queue-worker")
+        results = iter_queue_rows(queue, product_entries(), meta, progress=verbose)
+    else:
+        results = fetched_rows()
+    try:
+        for url, row, lastmod in tqdm(results, desc="Fetching product pages", unit="page", disable=not verbose):
+            if state is not None and "error" not in row:
+                state.put(url, lastmod, row)
+            emit(url, row)
+        if journal is not None:
+            # Rebuild the export from everything the journal holds, this run and earlier ones
+            for row in journal.iter_rows():
+                if not keep(row):
+                    continue
+                if "error" in row:
+                    errors += 1
+                writer.write(row)
+    finally:
+        results.close()
+        sitemap_pages.close()
+        deduper.close()
+        if own_resources:
+            resources.close()
+        writer.close()
+        for store in (journal, state, queue):
+            if store is not None:
+                store.close()
+
+    stats["sitemap_errors"] = len(failed_sitemaps)
+    summary = dict(stats, output=out_file, rows_written=writer.rows_written, errors=errors)
+    log(f"Total URLs in sitemap(s): {stats['sitemap_urls']}")
+    if failed_sitemaps:
+        log(f"Sitemaps that could not be read: {len(failed_sitemaps)}")
+    if stats["robots_blocked"]:
+        log(f"Disallowed by robots.txt: {stats['robots_blocked']}")
+    log(f"URLs after filters: {stats['filtered']}")
+    if stats["resumed"]:
+        log(f"Skipped (already in journal): {stats['resumed']}")
+    if stats["unchanged"]:
+        log(f"Reused (unchanged lastmod): {stats['unchanged']}")
+
+    if not stats["filtered"]:
+        os.remove(out_file)
+        summary["output"] = ""
+        if failed_sitemaps and not stats["sitemap_urls"]:
+            log("\nThe sitemap could not be read; nothing was exported.")
+            return summary
+        log("\nNo URLs matched your filters.")
+        log("Try relaxing filters (remove include keywords, remove product marker, etc.).")
+        return summary
+
+    log("\nDone ✅")
+    log(f"Output saved: {out_file}")
+    log(f"Rows written: {writer.rows_written}")
+    if errors:
+        log(f"Warnings: {errors} pages had errors. Check the 'error' column.")
+    return summary
 
-        except Exception as e:
-            errors += 1
-            rows.append({
-                "category": "",
-                "subcategory": "",
-                "title": "",
-                "price": None,
-                "currency": meta.get("currency_override") or "",
-                "stock": "",
-                "url": url,
-                "error": str(e),
-            })
-            time.sleep(polite_delay)
-
-    df = pd.DataFrame(rows)
 
-    # Make output filename from domain
+def default_output_path(sitemap_url: str, fmt: str = "", directory: str = "") -> str:
     domain = urlparse(sitemap_url).netloc.replace("www.", "")
-    out_file = f"{domain}_catalog.xlsx"
-    with pd.ExcelWriter(out_file, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="catalog")
+    return os.path.join(directory, f"{domain}_catalog.{fmt or 'xlsx'}")
 
-    print("\nDone ✅")
-    print(f"Excel saved: {out_file}")
-    print(f"Rows written: {len(df)}")
-    if errors:
-        print(f"Warnings: {errors} pages had errors. Check the 'error' column if present.")
+
+# Options a manifest entry may set; everything else configures the shared pools and clients.
+SHOP_OPTIONS = {
+    "sitemap_url", "product_marker", "include", "must_contain_any", "exclude", "include_out_of_stock",
+    "delay", "limit", "currency", "rate", "format", "output", "state", "journal", "dedupe_db", "ignore_robots",
+}
+
+
+def load_batch_manifest(path: str, parser: argparse.ArgumentParser) -> List[Dict[str, object]]:
+    """
+    Reads a batch manifest: a JSON list of shops, or {"defaults": {...}, "shops": [...]}.
+    Each shop is a dict of per-shop options (SHOP_OPTIONS) and needs a sitemap_url;
+    "defaults" apply to every shop that does not override them.
+    """
+    try:
+        with open(path, encoding="utf-8") as fh:
+            raw = json.load(fh)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Cannot read batch manifest {path}: {e}")
+    defaults: Dict[str, object] = {}
+    if isinstance(raw, dict):
+        defaults, raw = raw.get("defaults") or {}, raw.get("shops")
+    if not isinstance(raw, list) or not isinstance(defaults, dict):
+        raise SystemExit(f"Batch manifest {path} must be a list of shops or {{\"defaults\": ..., \"shops\": [...]}}.")
+
+    def normalize(entry: Dict[str, object], where: str) -> Dict[str, object]:
+        if not isinstance(entry, dict):
+            raise SystemExit(f"Batch manifest {path}: {where} must be an object.")
+        out = {}
+        for key, value in entry.items():
+            dest = key.replace("-", "_")
+            if dest not in SHOP_OPTIONS:
+                raise SystemExit(f"Batch manifest {path}: option {key!r} in {where} cannot be set per shop.")
+            out[dest] = value
+        return out
+
+    defaults = normalize(defaults, "defaults")
+    shops = []
+    for i, entry in enumerate(raw):
+        shop = dict(defaults, **normalize(entry, f"shop #{i + 1}"))
+        if not shop.get("sitemap_url"):
+            raise SystemExit(f"Batch manifest {path}: shop #{i + 1} has no sitemap_url.")
+        shops.append(shop)
+    return shops
+
+
+QUEUE_COMPLETE_EVERY = 50  # a worker stores rows after this many pages...
+QUEUE_COMPLETE_S = 2.0  # ...or this many seconds, whichever comes first
+
+
+def run_queue_worker(args: argparse.Namespace, poll_s: float = 2.0) -> None:
+    """
+    Worker side of --queue: leases product URLs, fetches and extracts them with the
+    usual clients and rate limits, and stores the rows back until the queue is drained.
+    Rows are stored as they finish, and a heartbeat renews the leases still held.
+    """
+    queue = WorkQueue(args.queue, lease_s=args.lease_seconds)
+    resources = open_export_resources(args, export_rate(args, args.delay))
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    robots = RobotsCache(resources.client) if not args.ignore_robots else None
+    rate = export_rate(args, args.delay)
+    rated_hosts: Set[str] = set()
+    batch_size = 2 * (args.max_in_flight if resources.async_client is not None else args.workers)
+    processed = 0
+    stop = threading.Event()
+
+    def heartbeat() -> None:
+        while not stop.wait(queue.lease_s / 3):
+            queue.renew(worker)
+
+    renewer = threading.Thread(target=heartbeat, name="queue-heartbeat", daemon=True)
+    renewer.start()
+    print(f"Queue worker {worker} on {args.queue}")
+    try:
+        with tqdm(desc="Queue pages", unit="page") as pbar:
+            while True:
+                urls = queue.lease(worker, batch_size)
+                if not urls:
+                    if queue.finished():
+                        break
+                    time.sleep(poll_s)
+                    continue
+                meta = {"currency_override": queue.get_meta("currency_override")}
+                for url in urls:
+                    host = urlparse(url).netloc
+                    if robots is not None and host not in rated_hosts:
+                        rated_hosts.add(host)
+                        resources.limiter.set_rate(url, robots.crawl_rate(url, rate, explicit=args.rate is not None))
+                rows = iter_product_rows(
+                    urls,
+                    headers=resources.headers,
+                    meta=meta,
+                    in_stock_only=False,
+                    workers=args.workers,
+                    client=resources.client,
+                    parse_pool=resources.parse_pool,
+                    async_client=resources.async_client,
+                )
+                done: List[Tuple[str, Dict[str, object]]] = []
+                flushed = time.monotonic()
+                for result in rows:
+                    done.append(result)
+                    if len(done) >= QUEUE_COMPLETE_EVERY or time.monotonic() - flushed >= QUEUE_COMPLETE_S:
+                        queue.complete(done)
+                        pbar.update(len(done))
+                        processed += len(done)
+                        done, flushed = [], time.monotonic()
+                queue.complete(done)
+                pbar.update(len(done))
+                processed += len(done)
+    finally:
+        stop.set()
+        renewer.join()
+        queue.release(worker)
+        queue.close()
+        resources.close()
+    print(f"Queue drained; this worker processed {processed} pages.")
+
+
+BATCH_STOP_GRACE_S = 10.0  # how long an interrupted batch waits for running shops to close their files
+
+
+def run_batch(args: argparse.Namespace, shops: List[Dict[str, object]]) -> None:
+    """
+    Exports every shop in one process: up to --batch-concurrency shops at a time share
+    one HTTP client, rate limiter and --workers fetch threads, scheduled round-robin
+    across shops. Each shop keeps its own filters, rate and output file.
+    """
+    if args.queue:
+        raise SystemExit("--queue cannot be combined with --batch.")
+    concurrency = max(1, min(args.batch_concurrency, len(shops)))
+    # A shop may use up to twice its even share of the pool when others are idle
+    lane_limit = max(1, -(-2 * args.workers // concurrency))
+    resources = open_export_resources(args, export_rate(args, args.delay))
+    resources.fetch_pool = FairExecutor(args.workers, lane_limit=lane_limit, thread_name_prefix="batch")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = []
+    paths: Set[str] = set()
+    for shop in shops:
+        shop_args = argparse.Namespace(**dict(vars(args), **shop))
+        shop_args.workers = lane_limit
+        shop_args.sitemap_url = normalize_site_url(shop_args.sitemap_url)
+        if not shop.get("output"):
+            shop_args.output = default_output_path(shop_args.sitemap_url, shop_args.format, args.output_dir)
+        for key in ("output", "state", "journal", "dedupe_db"):
+            path = getattr(shop_args, key)
+            if path and path in paths:
+                raise SystemExit(f"Two shops in the batch would use {path}; set \"{key}\" per shop.")
+            paths.add(path)
+        jobs.append(shop_args)
+
+    def run_shop(shop_args: argparse.Namespace) -> Dict[str, object]:
+        return run_export(shop_args, *settings_from_args(shop_args), resources=resources, verbose=False)
+
+    failed = 0
+    print(f"Exporting {len(jobs)} shops, {concurrency} at a time on {args.workers} shared workers…")
+    # Daemon threads: on Ctrl+C/SIGTERM a shop stuck in a slow request cannot keep the process alive
+    shop_pool = FairExecutor(concurrency, thread_name_prefix="shop")
+    futures: List[Tuple[argparse.Namespace, Future]] = []
+    interrupted = False
+    try:
+        futures = [(shop_args, shop_pool.submit_to("shops", run_shop, shop_args)) for shop_args in jobs]
+        for shop_args, fut in tqdm(futures, desc="Shops", unit="shop"):
+            # exception() waits without re-raising, so only Ctrl+C/SIGTERM can escape here
+            error = fut.exception()
+            if error is not None:
+                failed += 1
+                print(f"[WARN] {shop_args.sitemap_url}: export failed ({error})", file=sys.stderr)
+                continue
+            summary = fut.result()
+            if summary["sitemap_errors"]:
+                failed += 1
+                print(f"[WARN] {shop_args.sitemap_url}: {summary['sitemap_errors']} sitemap(s) could not be read.",
+                      file=sys.stderr)
+            if not summary["output"]:
+                if not summary["sitemap_errors"]:
+                    print(f"[WARN] {shop_args.sitemap_url}: no URLs matched the filters.", file=sys.stderr)
+                continue
+            note = f", {summary['errors']} errors" if summary["errors"] else ""
+            tqdm.write(f"{shop_args.sitemap_url}: {summary['rows_written']} rows -> {summary['output']}{note}")
+    except BaseException:
+        # Drop queued shops and page fetches; running shops then fail fast and close their
+        # journals and stores. Give them a moment to do so, then exit regardless.
+        interrupted = True
+        shop_pool.shutdown(wait=False, cancel_futures=True)
+        resources.fetch_pool.shutdown(wait=False, cancel_futures=True)
+        wait([fut for _, fut in futures], timeout=BATCH_STOP_GRACE_S)
+        raise
+    finally:
+        shop_pool.shutdown(wait=False)
+        resources.close(wait=not interrupted)
+
+    print(f"\nDone ✅ {len(jobs) - failed}/{len(jobs)} shops exported.")
+    if failed:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
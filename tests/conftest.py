@@ -0,0 +1,59 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SHOP_CHILDREN = 20
+SHOP_URLS_PER_CHILD = 3000
+
+
+class ShopHandler(BaseHTTPRequestHandler):
+    """A shop with a sitemap index of SHOP_CHILDREN children, SHOP_URLS_PER_CHILD products each."""
+
+    def do_GET(self):
+        base = f"http://{self.headers['Host']}"
+        path = self.path
+        if path == "/sitemap.xml":
+            body = "<sitemapindex xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">" + "".join(
+                f"<sitemap><loc>{base}/sitemaps/{i}.xml</loc></sitemap>" for i in range(SHOP_CHILDREN)
+            ) + "</sitemapindex>"
+            return self._send(body, "application/xml")
+        if path.startswith("/sitemaps/"):
+            i = path.rsplit("/", 1)[1].split(".")[0]
+            body = "<urlset xmlns=\"http://www.sitemaps.org/schemas/sitemap/0.9\">" + "".join(
+                f"<url><loc>{base}/p/{i}-{j}</loc></url>" for j in range(SHOP_URLS_PER_CHILD)
+            ) + "</urlset>"
+            return self._send(body, "application/xml")
+        if path.startswith("/p/"):
+            name = path[3:]
+            body = (
+                f"<html><head><title>Product {name}</title></head><body><h1>Product {name}</h1>"
+                f"<p class=\"price\">€ 12,50</p><p>In stock</p></body></html>"
+            )
+            return self._send(body, "text/html; charset=utf-8")
+        self.send_error(404)
+
+    def _send(self, body: str, content_type: str) -> None:
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def shop_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ShopHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,32 @@
+import os
+
+import sitemap_catalog_exporter as sce
+
+
+def test_cache_hit_does_not_lock_out_another_process(tmp_path):
+    first = sce.HttpCache(str(tmp_path))
+    first.put("https://shop.example/a", b"a", etag='"1"')
+    second = sce.HttpCache(str(tmp_path))
+    try:
+        assert first.get("https://shop.example/a") == (b"a", "")
+        # a read in one process must not hold a write transaction open
+        second._db.execute("PRAGMA busy_timeout = 100")
+        second.put("https://shop.example/b", b"b", etag='"2"')
+        assert second.get("https://shop.example/a") == (b"a", "")
+    finally:
+        first.close()
+        second.close()
+
+
+def test_cache_hits_refresh_eviction_order(tmp_path):
+    # random bodies so that gzip cannot shrink them below the limit
+    cache = sce.HttpCache(str(tmp_path), max_bytes=10_000)
+    try:
+        cache.put("https://shop.example/old", os.urandom(4000), etag='"1"')
+        cache.put("https://shop.example/new", os.urandom(4000), etag='"2"')
+        assert cache.get("https://shop.example/old") is not None
+        cache.put("https://shop.example/third", os.urandom(4000), etag='"3"')
+        assert cache.get("https://shop.example/old") is not None
+        assert cache.get("https://shop.example/new") is None
+    finally:
+        cache.close()
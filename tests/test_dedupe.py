@@ -0,0 +1,26 @@
+import pytest
+
+import sitemap_catalog_exporter as sce
+
+
+def test_fingerprint_set_keeps_members_across_growth():
+    fps = sce.FingerprintSet()
+    members = [(i * 0x9E3779B97F4A7C15) % 2**64 or 1 for i in range(1, 5000)]
+    assert all(fps.add(fp) for fp in members)
+    assert len(fps) == len(members)
+    assert not any(fps.add(fp) for fp in members)
+    # same low bits, so the second one probes past the first
+    assert fps.add(7) and fps.add(7 + (1 << 20))
+    assert not fps.add(7) and not fps.add(7 + (1 << 20))
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_url_deduper(tmp_path, on_disk):
+    deduper = sce.UrlDeduper(str(tmp_path / "seen.sqlite") if on_disk else "", capacity=1000)
+    try:
+        urls = [f"https://shop.example/p/{i}" for i in range(3000)]
+        assert all(deduper.add(url) for url in urls)
+        assert not any(deduper.add(url) for url in urls[::7])
+        assert deduper.add("https://shop.example/p/new")
+    finally:
+        deduper.close()
@@ -0,0 +1,145 @@
+import gzip
+
+import pytest
+
+import sitemap_catalog_exporter as sce
+from benchmarks.price_parsing import EDGE_CASES
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1.234,56", 1234.56),
+    ("1,234.56", 1234.56),
+    ("1'234.50", 1234.5),
+    ("€ 1 234,56", 1234.56),
+    ("0,99", 0.99),
+    ("1,5", 1.5),
+    ("1.299,-", 1299.0),
+    ("12", 12.0),
+    ("abc", None),
+    ("", None),
+])
+def test_parse_number(text, expected):
+    assert sce.parse_number(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Price: € 1.299,-", (1299.0, "EUR", None)),
+    ("10 - 20 $", (10.0, "USD", 20.0)),
+    ("€10 - €20", (10.0, "EUR", 20.0)),
+    ("19,95 EUR", (19.95, "EUR", None)),
+    ("R$ 12,50", (12.5, "BRL", None)),
+    ("Only 3 left, now $4.99", (4.99, "USD", None)),
+])
+def test_find_price(text, expected):
+    match = sce.find_price(text)
+    assert (match.amount, match.currency, match.high) == expected
+
+
+@pytest.mark.parametrize("text", ["no price here", "EURO 5", ""])
+def test_find_price_without_currency(text):
+    assert sce.find_price(text) is None
+
+
+@pytest.mark.parametrize("html, expected", EDGE_CASES)
+def test_price_edge_cases(html, expected):
+    assert sce.extract_price(sce.PageContext.from_html(f"<html><body>{html}</body></html>")) == expected
+
+
+ROBOTS = """\
+User-agent: *
+Disallow: /private
+Crawl-delay: 2
+
+Sitemap: https://shop.example/sitemap.xml
+User-agent: OtherBot
+User-agent: CatalogExporter
+Disallow: /
+Allow: /p/
+Disallow: /*.pdf$
+Allow: /p/x   # Allow wins a tie
+Disallow: /p/x
+"""
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/", False),
+    ("/about", False),
+    ("/p/1", True),
+    ("/p/manual.pdf", False),
+    ("/p/manual.pdf?download=1", True),
+    ("/p/x", True),
+])
+def test_robots_group_for_our_agent(path, expected):
+    rules = sce.RobotsRules.parse(ROBOTS, "CatalogExporter/1.0")
+    assert rules.allowed(f"https://shop.example{path}") is expected
+    assert rules.crawl_delay is None
+    assert rules.sitemaps == ["https://shop.example/sitemap.xml"]
+
+
+def test_robots_falls_back_to_the_star_group():
+    rules = sce.RobotsRules.parse(ROBOTS, "SomeCrawler")
+    assert rules.crawl_delay == 2.0
+    assert not rules.allowed("https://shop.example/private/1")
+    assert rules.allowed("https://shop.example/p/1")
+
+
+def test_empty_robots_allows_everything():
+    assert sce.RobotsRules.parse("", "CatalogExporter").allowed("https://shop.example/anything")
+
+
+def test_stock_phrases_whole_words_longest_first():
+    matcher = sce.StockPhraseMatcher({"in_stock": ["In stock", "available"], "out_of_stock": ["not in stock"]})
+    text = "not in stock. unavailable. available now, in stock"
+    assert matcher.find_all(text) == [
+        (0, "not in stock", "out_of_stock"),
+        (27, "available", "in_stock"),
+        (42, "in stock", "in_stock"),
+    ]
+    assert matcher.find_all("restocking soon") == []
+
+
+def test_stock_phrase_under_both_statuses_counts_as_out_of_stock():
+    matcher = sce.StockPhraseMatcher({"in_stock": ["sold out"], "out_of_stock": ["sold out"]})
+    assert matcher.find_all("sold out") == [(0, "sold out", "out_of_stock")]
+
+
+SITEMAP = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc> https://shop.example/p/1 </loc><lastmod>2024-05-01</lastmod><priority>0.8</priority></url>
+  <url><loc>https://shop.example/p/2</loc></url>
+  <url><lastmod>2024-05-01</lastmod></url>
+</urlset>
+"""
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_gunzip_stream_passes_plain_data_through():
+    assert b"".join(sce.gunzip_stream(chunked(SITEMAP, 1))) == SITEMAP
+
+
+def test_gunzip_stream_decompresses_small_chunks_and_concatenated_members():
+    data = gzip.compress(SITEMAP) + gzip.compress(b"<!-- more -->")
+    out = list(sce.gunzip_stream(chunked(data, 3), max_chunk=64))
+    assert b"".join(out) == SITEMAP + b"<!-- more -->"
+    assert max(map(len, out)) <= 64
+
+
+@pytest.mark.parametrize("size", [1, 7, 4096])
+def test_iter_sitemap_entries(size):
+    entries = list(sce.iter_sitemap_entries(chunked(SITEMAP, size)))
+    assert entries == [
+        sce.SitemapEntry("https://shop.example/p/1", lastmod="2024-05-01", priority="0.8"),
+        sce.SitemapEntry("https://shop.example/p/2"),
+    ]
+
+
+def test_iter_sitemap_entries_reads_indexes_and_broken_files():
+    index = b"<sitemapindex><sitemap><loc>https://shop.example/s1.xml</loc></sitemap></sitemapindex>"
+    assert [(e.kind, e.loc) for e in sce.iter_sitemap_entries([index])] == [("sitemap", "https://shop.example/s1.xml")]
+    broken = b"<urlset><url><loc>https://shop.example/p/1</loc></url><url><loc>https://shop.example/p/2</loc>"
+    assert [e.loc for e in sce.iter_sitemap_entries([broken])] == ["https://shop.example/p/1", "https://shop.example/p/2"]
+    bare = b"<urlset><loc>https://shop.example/p/3</loc></urlset>"
+    assert [e.loc for e in sce.iter_sitemap_entries([bare])] == ["https://shop.example/p/3"]
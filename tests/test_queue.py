@@ -0,0 +1,43 @@
+import sqlite3
+
+import sitemap_catalog_exporter as sce
+
+
+def test_queue_results_carry_the_lastmod(tmp_path):
+    queue = sce.WorkQueue(str(tmp_path / "queue.db"))
+    try:
+        run = queue.start_run()
+        queue.enqueue([("https://shop.example/p/1", "2024-05-01"), ("https://shop.example/p/2", "")], run)
+        leased = queue.lease("w1", 10)
+        assert leased == ["https://shop.example/p/1", "https://shop.example/p/2"]
+        queue.complete((url, {"url": url, "title": "T"}) for url in leased)
+        assert [(url, lastmod) for url, _, lastmod in queue.iter_results()] == [
+            ("https://shop.example/p/1", "2024-05-01"),
+            ("https://shop.example/p/2", ""),
+        ]
+        # a later run updates the lastmod and reuses the finished row
+        run = queue.start_run()
+        queue.enqueue([("https://shop.example/p/1", "2024-06-01")], run)
+        assert [(url, row["title"], lastmod) for url, row, lastmod in queue.iter_results()] == [
+            ("https://shop.example/p/1", "T", "2024-06-01"),
+        ]
+    finally:
+        queue.close()
+
+
+def test_queue_adds_missing_columns_to_old_files(tmp_path):
+    path = str(tmp_path / "queue.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE tasks (seq INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL UNIQUE,"
+        " status INTEGER NOT NULL DEFAULT 0, lease_until REAL NOT NULL DEFAULT 0, worker TEXT,"
+        " attempts INTEGER NOT NULL DEFAULT 0, row TEXT)"
+    )
+    db.commit()
+    db.close()
+    queue = sce.WorkQueue(path)
+    try:
+        queue.enqueue([("https://shop.example/p/1", "2024-05-01")], queue.start_run())
+        assert queue.counts()["pending"] == 1
+    finally:
+        queue.close()
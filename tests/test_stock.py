@@ -0,0 +1,50 @@
+import pytest
+
+import sitemap_catalog_exporter as sce
+
+
+def stock(html):
+    page = sce.PageContext.from_html(f"<html><body>{html}</body></html>")
+    return sce.extract_stock_status(page), sce.find_stock_match(page)
+
+
+@pytest.mark.parametrize("html, status, zone", [
+    # a disabled add-to-cart button does not make a sold-out product available
+    ('<p>Out of stock</p><form action="/cart/add"><button disabled>Add to cart</button></form>', "out_of_stock", "main"),
+    # a stock label in the buy box beats one elsewhere on the page
+    ('<p>Related: out of stock</p><div class="buy-box"><span>In stock</span><button>Add to cart</button></div>',
+     "in_stock", "buy_box"),
+    # the container of an add-to-cart button is the buy box
+    ('<div><span>In stock</span><button class="add-to-cart">Add</button></div><footer>Out of stock</footer>',
+     "in_stock", "buy_box"),
+    ('<div class="related"><a href="/x">Widget in stock</a></div><p>Sold out</p>', "out_of_stock", "main"),
+    ("<p>Add to cart</p>", "in_stock", "main"),
+])
+def test_stock_ranking(html, status, zone):
+    got, match = stock(html)
+    assert got == status
+    assert match.zone == zone
+
+
+def test_footer_phrases_say_nothing():
+    got, match = stock("<main><h1>Widget</h1></main><footer>Items in stock ship today</footer>")
+    assert got == ""
+    assert match.zone == "footer"
+
+
+def test_zone_comes_from_the_element_not_the_first_occurrence():
+    # "Sale in stock" appears in the buy box and again in the footer
+    html = '<header>Sale</header><form action="/cart"><p>Sale in stock</p><button>Add</button></form>' \
+           "<footer>Sale in stock</footer>"
+    page = sce.PageContext.from_html(html)
+    first = page.lower_text.find("in stock")
+    second = page.lower_text.find("in stock", first + 1)
+    assert page.zone_at(first) == "buy_box"
+    assert page.zone_at(second) == "footer"
+
+
+def test_text_matches_get_text():
+    html = "<html><head><title>T</title><script>var x = 1</script></head><body><!-- c --><p> a  b </p>" \
+           "<div>\n<span>c</span> </div></body></html>"
+    page = sce.PageContext.from_html(html)
+    assert page.text == page.soup.get_text(" ", strip=True)